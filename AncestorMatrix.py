@@ -0,0 +1,80 @@
+"""
+A precomputed reachability structure for answering many ancestor, cousin
+and unrelated checks in a row
+"""
+
+
+from itertools import islice
+
+
+class AncestorMatrix:
+    # The relations that can be answered from ancestor bitsets alone
+    RELATIONS = ('ancestor', 'cousin', 'unrelated')
+
+    def __init__(self, tree):
+        """
+        Every person in the tree gets a bit, in the order they were added, and an
+        integer bitset of their ancestors. Parents are always added before their
+        children, so each row is just the union of the parents' rows.
+
+        :param tree: FamilyTree or ColumnarFamilyTree
+        """
+        self.tree = tree
+        self.index = {}  # String -> int
+        self.rows = list()  # int -> int bitset of ancestors
+        self.refresh()
+
+    def refresh(self):
+        """
+        Add rows for everyone who joined the tree since the last refresh.
+
+        :return: None
+        """
+        if len(self.rows) == len(self.tree):
+            return
+        for name in islice(self.tree, len(self.rows), None):
+            position = len(self.rows)
+            person = self.tree.get_person(name)
+            parent1 = person.get_parent1()
+            parent2 = person.get_parent2()
+            row = 0
+            if parent1 is not None and parent2 is not None:
+                bit1 = self.index[parent1.get_name()]
+                bit2 = self.index[parent2.get_name()]
+                row = self.rows[bit1] | self.rows[bit2] | (1 << bit1) | (1 << bit2)
+            self.index[name] = position
+            self.rows.append(row)
+
+    def answer(self, name1, relation, name2):
+        """
+        Check whether the first person is the <relation> of the second person,
+        using the same definitions as Person.
+
+        :param name1: String
+        :param relation: String, one of RELATIONS
+        :param name2: String
+        :return: Boolean
+        """
+        bit1 = self.index[name1]
+        bit2 = self.index[name2]
+        row1 = self.rows[bit1]
+        row2 = self.rows[bit2]
+        if relation == 'ancestor':
+            return row2 >> bit1 & 1 == 1
+        if bit1 == bit2:
+            return relation == 'unrelated'
+        lineal = row2 >> bit1 & 1 or row1 >> bit2 & 1
+        shared = row1 & row2 != 0
+        if relation == 'cousin':
+            return not lineal and shared
+        return not lineal and not shared
+
+    def answer_batch(self, queries):
+        """
+        Answer a block of queries against one refreshed matrix.
+
+        :param queries: list of (String, String, String) tuples of name, relation, name
+        :return: list of Booleans
+        """
+        self.refresh()
+        return [self.answer(name1, relation, name2) for name1, relation, name2 in queries]
@@ -0,0 +1,239 @@
+"""
+Benchmarks for the family tree engines on synthetic genealogies. Each run
+times E ingestion and every W and X relation, and can be saved as a JSON
+baseline to compare later runs against.
+"""
+
+
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import time
+import Carlock
+import main
+from ColumnarTree import ColumnarFamilyTree
+from FamilyTree import FamilyTree
+from Synthetic import SHAPES, generate
+
+
+# Each engine is a table of command handlers and a factory for an empty tree
+ENGINES = {
+    'person': (main.COMMANDS, FamilyTree),
+    'columnar': (main.COMMANDS, ColumnarFamilyTree),
+    'carlock': (Carlock.COMMANDS, dict),
+}
+
+RELATIONS = ('child', 'spouse', 'sibling', 'ancestor', 'cousin', 'unrelated')
+
+# A run is flagged as a regression when it is this much slower than the baseline
+REGRESSION_RATIO = 1.2
+
+
+def percentile(latencies, fraction):
+    """
+    :param latencies: sorted list of floats
+    :param fraction: float between 0 and 1
+    :return: float
+    """
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+def summarize(latencies):
+    """
+    :param latencies: list of floats, in seconds
+    :return: dict of throughput and latency percentiles in milliseconds
+    """
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'count': len(latencies),
+        'per_second': len(latencies) / total if total > 0 else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def run_queries(commands, tree, queries):
+    """
+    Time each query on its own.
+
+    :param commands: dict of command handlers
+    :param tree: the engine's tree
+    :param queries: list of query strings ending in newlines
+    :return: list of floats, in seconds
+    """
+    out = io.StringIO()
+    latencies = list()
+    for query in queries:
+        parts = query[:-1].split(' ')
+        start = time.perf_counter()
+        commands[parts[0]](tree, query, parts, out)
+        latencies.append(time.perf_counter() - start)
+        out.seek(0)
+        out.truncate()
+    return latencies
+
+
+def resident_kb():
+    """
+    :return: int, the resident memory of this process now, in KiB
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_engine(engine, size, shape, seed, count):
+    """
+    Generate the workload, load its events into a fresh tree and time each kind
+    of query. Meant to run in a freshly spawned process, so that nothing but
+    this engine and its workload is ever resident. The events are streamed from
+    the generator, and the tree's memory is the growth in resident memory
+    while they are loaded.
+
+    :param engine: String, one of ENGINES
+    :param size: int, the number of people to generate
+    :param shape: String, one of SHAPES
+    :param seed: int
+    :param count: int, queries per relation
+    :return: dict of results
+    """
+    commands, factory = ENGINES[engine]
+    queries = make_queries(generate(size, shape, seed), count, seed)
+    tree = factory()
+    out = io.StringIO()
+    add_event = commands['E']
+    events = 0
+    before = resident_kb()
+    start = time.perf_counter()
+    for line in generate(size, shape, seed):
+        add_event(tree, line + '\n', line.split(' '), out)
+        events += 1
+    elapsed = time.perf_counter() - start
+    results = {'ingest': {'count': events, 'seconds': elapsed,
+                          'per_second': events / elapsed if elapsed > 0 else 0.0},
+               'tree_rss_kb': resident_kb() - before}
+    for label, block in queries.items():
+        results[label] = summarize(run_queries(commands, tree, block))
+    results['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+def make_queries(events, count, seed):
+    """
+    Pick the same sample of W and X queries for every engine. W sibling only
+    asks about people who have parents.
+
+    :param events: iterable of E query strings
+    :param count: int, queries per relation
+    :param seed: int
+    :return: dict of String -> list of query strings
+    """
+    rng = random.Random(seed)
+    names = set()
+    children = set()
+    for query in events:
+        parts = query.split()
+        names.update(parts[1:])
+        if len(parts) == 4:
+            children.add(parts[3])
+    names = sorted(names)
+    children = sorted(children)
+    queries = dict()
+    for relation in RELATIONS:
+        pool = children if relation == 'sibling' else names
+        queries['W ' + relation] = ['W ' + relation + ' ' + rng.choice(pool) + '\n' for _ in range(count)]
+        queries['X ' + relation] = ['X ' + rng.choice(children) + ' ' + relation + ' '
+                                    + rng.choice(children) + '\n' for _ in range(count)]
+    return queries
+
+
+def benchmark(engines, sizes, shape, seed, count):
+    """
+    Run every engine on the same workload at every size, each in a freshly
+    spawned process. A forked process would start out holding all of this
+    process's memory, and report it as the engine's own.
+
+    :return: dict of results keyed by engine, then size
+    """
+    context = multiprocessing.get_context('spawn')
+    report = {'shape': shape, 'seed': seed, 'queries': count, 'results': {}}
+    for size in sizes:
+        for engine in engines:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_engine, (engine, size, shape, seed, count))
+            report['results'].setdefault(engine, {})[str(size)] = result
+            print_result(engine, size, result)
+    return report
+
+
+def print_result(engine, size, result):
+    print(engine, size, 'people:', '%.0f E/s,' % result['ingest']['per_second'],
+          'tree %d KiB, peak RSS %d KiB' % (result['tree_rss_kb'], result['peak_rss_kb']))
+    for label in sorted(result):
+        if label.startswith(('W ', 'X ')):
+            stats = result[label]
+            print('    %-12s %10.1f/s  p50 %8.3f ms  p95 %8.3f ms  p99 %8.3f ms'
+                  % (label, stats['per_second'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms']))
+    sys.stdout.flush()
+
+
+def compare(report, baseline):
+    """
+    Print every measurement that got slower than the baseline by more than
+    REGRESSION_RATIO.
+
+    :param report: dict from benchmark
+    :param baseline: dict from an earlier benchmark
+    :return: int, the number of regressions
+    """
+    regressions = 0
+    for engine, sizes in report['results'].items():
+        for size, result in sizes.items():
+            old = baseline['results'].get(engine, {}).get(size)
+            if old is None:
+                continue
+            for label, stats in result.items():
+                if not isinstance(stats, dict) or label not in old:
+                    continue
+                before = old[label]['per_second']
+                after = stats['per_second']
+                if after > 0 and before / after > REGRESSION_RATIO:
+                    regressions += 1
+                    print('REGRESSION', engine, size, label,
+                          '%.1f/s -> %.1f/s' % (before, after))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the family tree engines on synthetic genealogies.')
+    parser.add_argument('--engines', default='person,columnar,carlock',
+                        help='comma-separated engines from: ' + ', '.join(sorted(ENGINES)))
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated numbers of people, e.g. 1000,100000,10000000')
+    parser.add_argument('--shape', choices=sorted(SHAPES), default='mixed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--queries', type=int, default=100, help='queries timed per relation')
+    parser.add_argument('--save', metavar='PATH', help='write the results to a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='report regressions against a JSON baseline')
+    args = parser.parse_args()
+
+    report = benchmark(args.engines.split(','), [int(size) for size in args.sizes.split(',')],
+                       args.shape, args.seed, args.queries)
+    if args.save is not None:
+        with open(args.save, 'w') as baseline:
+            json.dump(report, baseline, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare) as baseline:
+            if compare(report, json.load(baseline)):
+                sys.exit(1)
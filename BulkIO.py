@@ -0,0 +1,27 @@
+"""
+Reading queries in large blocks, shared by both main loops' bulk modes
+"""
+
+
+# Input is read and output is written in blocks of this many characters in bulk mode
+BUFFER_SIZE = 1 << 20
+
+
+def read_chunks(stream):
+    """
+    Read the stream in large blocks and split it into lines. Every line keeps its
+    newline, except a final line that had none, just like readline.
+
+    :param stream: file
+    :return: A generator of strings
+    """
+    pending = ''
+    chunk = stream.read(BUFFER_SIZE)
+    while chunk:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+        chunk = stream.read(BUFFER_SIZE)
+    if pending:
+        yield pending
@@ -10,6 +10,17 @@ Patrick Sullivan
 
 
 import sys
+from bisect import insort
+from collections import OrderedDict
+from BulkIO import BUFFER_SIZE, read_chunks
+
+
+# Ancestor sets are memoized per name, since a person's ancestors never change
+# once they are created. The cache holds at most ANCESTOR_CACHE_SIZE names in
+# total across all sets, evicting the least recently used sets first.
+ANCESTOR_CACHE_SIZE = 10000000
+ancestor_cache = OrderedDict()
+ancestor_cache_size = 0
 
 
 def create_person(name, parent1, parent2):
@@ -24,36 +35,38 @@ def create_person(name, parent1, parent2):
     """
     person = dict()
     person['name'] = name  # String
-    person['spouses'] = list()
+    person['spouses'] = list()  # Sorted list of strings
+    person['spouse_set'] = set()  # The same names, for constant-time lookups
     person['parent1'] = parent1  # Dict
     person['parent2'] = parent2  # Dict
-    person['children'] = list()
+    person['children'] = list()  # Sorted list of strings
     return person
 
 
 def add_spouse(person, spouse):
     """
-    Access the list of spouses for the given person, and append the new spouse.
+    Access the list of spouses for the given person, and insert the new spouse
+    in sorted order unless they are already there.
 
     :param person: Dict
     :param spouse: Dict
     :return: None
     """
-    if spouse['name'] not in person['spouses']:
-        person['spouses'].append(spouse['name'])
-    person['spouses'].sort()
+    if spouse['name'] not in person['spouse_set']:
+        person['spouse_set'].add(spouse['name'])
+        insort(person['spouses'], spouse['name'])
 
 
 def add_child(person, child):
     """
-    Access the list of children for the given person, and append the new child.
+    Access the list of children for the given person, and insert the new child
+    in sorted order.
 
     :param person: Dict
     :param child: Dict
     :return: None
     """
-    person['children'].append(child['name'])
-    person['children'].sort()
+    insort(person['children'], child['name'])
 
 
 def get_children(person):
@@ -93,28 +106,80 @@ def get_siblings(person):
     return siblings
 
 
-def get_ancestors(person):
+def cache_ancestors(person, ancestors):
     """
-    Recurse through the parents of the person, and gather the list
-    of direct ancestors.
+    Store the ancestor set of the given person, evicting the least recently
+    used sets until the cache fits within ANCESTOR_CACHE_SIZE again.
 
     :param person: Dict
-    :return: list of strings
+    :param ancestors: frozenset of strings
+    :return: None
     """
-    ancestors = list()
-    if person['parent1'] is None or person['parent2'] is None:
+    global ancestor_cache_size
+    if len(ancestors) > ANCESTOR_CACHE_SIZE:
+        return
+    ancestor_cache[person['name']] = ancestors
+    ancestor_cache_size += len(ancestors)
+    while ancestor_cache_size > ANCESTOR_CACHE_SIZE:
+        ancestor_cache_size -= len(ancestor_cache.popitem(last=False)[1])
+
+
+def clear_ancestor_cache():
+    """
+    Forget every cached ancestor set. Names are only unique within one tree, so
+    this must be done before a new tree is built.
+
+    :return: None
+    """
+    global ancestor_cache_size
+    ancestor_cache.clear()
+    ancestor_cache_size = 0
+
+
+def get_ancestor_set(person):
+    """
+    Walk up through the parents without recursion, and gather the set of direct
+    ancestors. Ancestors whose own sets are cached are not walked past.
+
+    :param person: Dict
+    :return: frozenset of strings
+    """
+    ancestors = ancestor_cache.get(person['name'])
+    if ancestors is not None:
+        ancestor_cache.move_to_end(person['name'])
         return ancestors
-    else:
-        ancestors.append(person['parent1']['name'])
-        ancestors.append(person['parent2']['name'])
-        for anc in get_ancestors(person['parent1']):
-            ancestors.append(anc)
-        for anc in get_ancestors(person['parent2']):
-            ancestors.append(anc)
-    ancestors.sort()
+    if person['parent1'] is None or person['parent2'] is None:
+        return frozenset()
+    ancestors = set()
+    frontier = [person]
+    while frontier:
+        current = frontier.pop()
+        if current['parent1'] is None or current['parent2'] is None:
+            continue
+        for parent in (current['parent1'], current['parent2']):
+            if parent['name'] in ancestors:
+                continue
+            ancestors.add(parent['name'])
+            if parent['name'] in ancestor_cache:
+                ancestors.update(ancestor_cache[parent['name']])
+            else:
+                frontier.append(parent)
+    ancestors = frozenset(ancestors)
+    cache_ancestors(person, ancestors)
     return ancestors
 
 
+def get_ancestors(person):
+    """
+    Gather the list of direct ancestors. Each ancestor is listed once, even
+    when they can be reached through both parents.
+
+    :param person: Dict
+    :return: list of strings
+    """
+    return sorted(get_ancestor_set(person))
+
+
 def is_child(person1, person2):
     """
     Check person1 is a direct child of person2
@@ -125,7 +190,7 @@ def is_child(person1, person2):
     if person1['parent1'] is None or person1['parent2'] is None:
         return False
     else:
-        return person1['parent1'] == person2 or person1['parent2'] == person2
+        return person1['parent1'] is person2 or person1['parent2'] is person2
 
 
 def is_spouse(person1, person2):
@@ -136,7 +201,7 @@ def is_spouse(person1, person2):
     :param person2: Dict
     :return: Boolean
     """
-    return person2['name'] in person1['spouses']
+    return person2['name'] in person1['spouse_set']
 
 
 def is_sibling(person1, person2):
@@ -147,15 +212,15 @@ def is_sibling(person1, person2):
     :param person2: Dict
     :return: Boolean
     """
-    if person1 == person2:
+    if person1 is person2:
         return False
     elif person1['parent1'] is not None and \
-            (person1['parent1'] == person2['parent1']
-             or person1['parent1'] == person2['parent2']):
+            (person1['parent1'] is person2['parent1']
+             or person1['parent1'] is person2['parent2']):
         return True
     elif person1['parent2'] is not None and \
-            (person1['parent2'] == person2['parent1']
-             or person1['parent2'] == person2['parent2']):
+            (person1['parent2'] is person2['parent1']
+             or person1['parent2'] is person2['parent2']):
         return True
     else:
         return False
@@ -169,7 +234,7 @@ def is_ancestor(person1, person2):
     :param person2: Dict
     :return: Boolean
     """
-    return person1['name'] in get_ancestors(person2)
+    return person1['name'] in get_ancestor_set(person2)
 
 
 def is_cousin(person1, person2):
@@ -180,22 +245,18 @@ def is_cousin(person1, person2):
     :param person2: Dict
     :return: Boolean
     """
-    if person1 == person2:
+    if person1 is person2:
         return False
     elif is_child(person1, person2) or is_child(person2, person1):
         return False
     else:
-        ancestors1 = get_ancestors(person1)
-        ancestors2 = get_ancestors(person2)
+        ancestors1 = get_ancestor_set(person1)
+        ancestors2 = get_ancestor_set(person2)
 
         if person2['name'] in ancestors1 or person1['name'] in ancestors2:
             return False
 
-        for anc in ancestors1:
-            if anc in ancestors2:
-                return True
-
-    return False
+        return not ancestors1.isdisjoint(ancestors2)
 
 
 def is_unrelated(person1, person2):
@@ -207,7 +268,7 @@ def is_unrelated(person1, person2):
     :param person2: Dict
     :return: Boolean
     """
-    if person1 == person2:
+    if person1 is person2:
         return True
     elif is_child(person1, person2) or is_child(person2, person1):
         return False
@@ -253,165 +314,195 @@ def get_unrelated(tree, person):
     return result
 
 
-def main():
+def find_invalid_names(parts):
+    """
+    Check every part of a query in a single pass. Names with more than 40
+    characters, or with hyphens, are not allowed.
+
+    :param parts: list of strings
+    :return: list of error messages, all length errors before all hyphen errors
+    """
+    too_long = list()
+    hyphenated = list()
+    for i in parts:
+        if len(i) > 40:
+            too_long.append('The name ' + i + ' is not a valid entry. Names with more than 40 characters are not allowed.')
+        if '-' in i:
+            hyphenated.append('The name ' + i + ' is not a valid entry. Hyphens are not valid in names.')
+    return too_long + hyphenated
+
+
+def get_or_create(tree, name):
+    """
+    Return the person with the given name, creating them without parents if needed.
+
+    :param tree: Dict
+    :param name: String
+    :return: Dict
+    """
+    if name not in tree:
+        tree[name] = create_person(name, None, None)
+    return tree[name]
+
+
+def add_event(tree, query, parts, out):
+    """
+    Record one E query: a marriage of two people, or a child of two parents.
+
+    :param tree: Dict
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :return: False if processing should stop, otherwise True
+    """
+    if len(parts) == 3:  # New Marriage
+        person1 = get_or_create(tree, parts[1])
+        person2 = get_or_create(tree, parts[2])
+
+        # Set the proper spouse for the entries
+        add_spouse(person1, person2)
+        add_spouse(person2, person1)
+
+    elif len(parts) == 4:  # New Child
+        person1 = get_or_create(tree, parts[1])
+        person2 = get_or_create(tree, parts[2])
+
+        # Marry the parents if not already done
+        add_spouse(person1, person2)
+        add_spouse(person2, person1)
+
+        # Create the child if they don't exist
+        if parts[3] in tree:
+            print(parts[3], ' already exists! Child not created.', file=out)
+        else:
+            person3 = create_person(parts[3], person1, person2)
+            tree[parts[3]] = person3
+            add_child(person1, person3)
+            add_child(person2, person3)
+
+    else:
+        print('Please enter a valid query.', file=out)
+        return False
+    return True
+
+
+# W <relation> <person>: how to list each relation of a person
+LISTS = {
+    'child': lambda tree, person: get_children(person),
+    'spouse': lambda tree, person: get_spouses(person),
+    'sibling': lambda tree, person: get_siblings(person),
+    'ancestor': lambda tree, person: get_ancestors(person),
+    'cousin': get_cousins,
+    'unrelated': get_unrelated,
+}
+
+
+def list_relation(tree, query, parts, out):
+    """
+    Answer one W query by listing every <relation> of <person>.
+
+    :param tree: Dict
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :return: True
+    """
+    if len(parts) == 3:
+        print(query[:-1], file=out)
+        if parts[2] not in tree:
+            print(parts[2], ' does not exist!', file=out)
+        elif parts[1] in LISTS:
+            for name in LISTS[parts[1]](tree, tree[parts[2]]):
+                print(name, file=out)
+        else:
+            print('Please enter a valid query.', file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
+
+
+# X <person> <relation> <person>: how to check each relation
+CHECKS = {
+    'child': is_child,
+    'spouse': is_spouse,
+    'sibling': is_sibling,
+    'ancestor': is_ancestor,
+    'cousin': is_cousin,
+    'unrelated': is_unrelated,
+}
+
+
+def answer_relation(tree, query, parts, out):
+    """
+    Answer one X query.
+
+    :param tree: Dict
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :return: True
+    """
+    if len(parts) == 4:
+        print(query[:-1], file=out)
+
+        person1 = tree[parts[1]]
+        person2 = tree[parts[3]]
+
+        if parts[2] in CHECKS:
+            if CHECKS[parts[2]](person1, person2):
+                print('Yes', file=out)
+            else:
+                print('No', file=out)
+        else:
+            print('Please enter a valid query.', file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
+
+
+COMMANDS = {
+    'E': add_event,
+    'W': list_relation,
+    'X': answer_relation,
+}
+
+
+def main(lines=None, out=None):
+    """
+    Process queries until the input runs out or a query stops processing.
+
+    :param lines: iterator of query strings, read from standard input by default
+    :param out: file to print to, standard output by default
+    :return: None
+    """
     tree = dict()
-    query = sys.stdin.readline()
+    clear_ancestor_cache()
+    if lines is None:
+        lines = iter(sys.stdin.readline, '')
+    if out is None:
+        out = sys.stdout
 
-    while query:
+    for query in lines:
         if query[-1] == '\n':
             parts = query[:-1].split(' ')
         else:
             parts = query.split(' ')
-# Ensure names are valid
-#--------------------------
-        invalid = 0
-        for i in parts:
-            if len(i)>40:
-                print('The name '+ i +' is not a valid entry. Names with more than 40 characters are not allowed.')
-                invalid=1
-
-        for i in parts:
-            if i.find('-') != -1:
-               print('The name '+ i +' is not a valid entry. Hyphens are not valid in names.')
-               invalid=1
-        if invalid==1:
-            break
-#----------------------------
-
-        if parts[0] == 'E':
-            if len(parts) == 3:  # New Marriage
-
-                # Initialize person
-                if parts[1] not in tree:
-                    person1 = create_person(parts[1], None, None)
-                    tree[parts[1]] = person1
-                else:
-                    person1 = tree[parts[1]]
-                if parts[2] not in tree:
-                    person2 = create_person(parts[2], None, None)
-                    tree[parts[2]] = person2
-                else:
-                    person2 = tree[parts[2]]
-
-                # Set the proper spouse for the entries
-                add_spouse(person1, person2)
-                add_spouse(person2, person1)
-
-            elif len(parts) == 4:  # New Child
-
-                # Initialize Parents
-                if parts[1] not in tree:
-                    person1 = create_person(parts[1], None, None)
-                    tree[parts[1]] = person1
-                else:
-                    person1 = tree[parts[1]]
-                if parts[2] not in tree:
-                    person2 = create_person(parts[2], None, None)
-                    tree[parts[2]] = person2
-                else:
-                    person2 = tree[parts[2]]
-
-                # Marry the parents if not already done
-                add_spouse(person1, person2)
-                add_spouse(person2, person1)
-
-                # Create the child if they don't exist
-                if parts[3] in tree:
-                    print(parts[3], ' already exists! Child not created.')
-                else:
-                    person3 = create_person(parts[3], person1, person2)
-                    tree[parts[3]] = person3
-                    add_child(person1, person3)
-                    add_child(person2, person3)
 
-            else:
-                print('Please enter a valid query.')
-                break
-
-        elif parts[0] == 'W':  # List all <relation> of <person>
-            if len(parts) == 3:
-                print(query[:-1])
-                if parts[2] not in tree:
-                    print(parts[2], ' does not exist!')
-                else:
-                    person = tree[parts[2]]
-                    if parts[1] == 'child':
-                        for child in get_children(person):
-                            print(child)
-                    elif parts[1] == 'spouse':
-                        for spouse in get_spouses(person):
-                            print(spouse)
-                    elif parts[1] == 'sibling':
-                        for sibling in get_siblings(person):
-                            print(sibling)
-                    elif parts[1] == 'ancestor':
-                        for ancestor in get_ancestors(person):
-                            print(ancestor)
-                    elif parts[1] == 'cousin':
-                        for cousin in get_cousins(tree, person):
-                            print(cousin)
-                    elif parts[1] == 'unrelated':
-                        for unrelated in get_unrelated(tree, person):
-                            print(unrelated)
-                    else:
-                        print('Please enter a valid query.')
-            else:
-                print('Please enter a valid query.')
-            print()
-
-        elif parts[0] == 'X':  # Is <person> the <relation> of <person>?
-            if len(parts) == 4:
-                print(query[:-1])
-
-                person1 = tree[parts[1]]
-                if person1 is None:
-                    print(parts[1], 'does not exist!')
-                    break
-                person2 = tree[parts[3]]
-                if person2 is None:
-                    print(parts[3], ' does not exist!')
-                    break
-
-                if parts[2] == 'child':
-                    if is_child(person1, person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'spouse':
-                    if is_spouse(person1, person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'sibling':
-                    if is_sibling(person1, person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'ancestor':
-                    if is_ancestor(person1, person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'cousin':
-                    if is_cousin(person1, person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'unrelated':
-                    if is_unrelated(person1, person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                else:
-                    print('Please enter a valid query.')
-            else:
-                print('Please enter a valid query.')
-            print()
-        else:
-            print('Please enter a valid query.')
-            print()
+        # Ensure names are valid
+        errors = find_invalid_names(parts)
+        if errors:
+            for error in errors:
+                print(error, file=out)
+            break
 
-        query = sys.stdin.readline()
+        command = COMMANDS.get(parts[0])
+        if command is None:
+            print('Please enter a valid query.', file=out)
+            print(file=out)
+        elif not command(tree, query, parts, out):
+            break
 
 
 if __name__ == '__main__':
@@ -420,4 +511,9 @@ if __name__ == '__main__':
     before running any actual commands. Syntax errors and other compiler issues will be found
     quicker this way. __name__ == '__main__' is simply best practice for running python programs.
     """
-    main()
+    if '--bulk' in sys.argv[1:]:
+        with open(sys.stdout.fileno(), 'w', buffering=BUFFER_SIZE,
+                  encoding=sys.stdout.encoding, closefd=False) as out:
+            main(read_chunks(sys.stdin), out)
+    else:
+        main()
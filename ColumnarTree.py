@@ -0,0 +1,398 @@
+"""
+A compact family tree backend. Every person is a dense integer ID, and their
+parents, children and spouses live in flat arrays instead of Person objects.
+"""
+
+
+import sys
+from array import array
+
+
+NO_ID = -1
+
+
+class ColumnarPerson:
+    __slots__ = ('tree', 'id')
+
+    def __init__(self, tree, id):
+        """
+        A lightweight handle on one person of a ColumnarFamilyTree. It answers the
+        same getters and queries as Person, reading everything from the tree's columns.
+
+        :param tree: ColumnarFamilyTree
+        :param id: int
+        """
+        self.tree = tree
+        self.id = id
+
+    def get_name(self):
+        return self.tree.names[self.id]
+
+    def get_spouses(self):
+        return self.tree.get_names(self.tree.spouses.targets(self.id))
+
+    def get_parent1(self):
+        return self.tree.handle(self.tree.parent1[self.id])
+
+    def get_parent2(self):
+        return self.tree.handle(self.tree.parent2[self.id])
+
+    def get_children(self):
+        return self.tree.get_names(self.tree.children.targets(self.id))
+
+    def add_spouse(self, spouse):
+        self.tree.spouses.link(self.id, spouse.id)
+        self.tree.marriages.add(self.tree.marriage_key(self.id, spouse.id))
+
+    def add_child(self, child):
+        self.tree.children.link(self.id, child.id)
+
+    def get_ancestors(self):
+        """
+        :return: A list of strings of ancestors' names.
+        """
+        return self.tree.get_names(self.tree.get_ancestor_ids(self.id))
+
+    def get_siblings(self):
+        """
+        Gather the children of each parent, and remove the person themselves.
+
+        :return: A list of strings of siblings' names.
+        """
+        tree = self.tree
+        siblings = list()
+        if tree.parent1[self.id] != NO_ID:
+            siblings.extend(tree.children.targets(tree.parent1[self.id]))
+        if tree.parent2[self.id] != NO_ID:
+            for child in tree.children.targets(tree.parent2[self.id]):
+                if child not in siblings:
+                    siblings.append(child)
+        if self.id in siblings:
+            siblings.remove(self.id)
+        return tree.get_names(siblings)
+
+    def get_full_siblings(self):
+        """
+        :return: A list of strings of the names of the other children of this person's parents.
+        """
+        tree = self.tree
+        if tree.parent1[self.id] == NO_ID or tree.parent2[self.id] == NO_ID:
+            return list()
+        return tree.get_names(child for child in tree.children.targets(tree.parent1[self.id])
+                              if child != self.id and self.is_full_sibling(ColumnarPerson(tree, child)))
+
+    def get_half_siblings(self):
+        """
+        :return: A list of strings of the names of children who share exactly one parent with this person.
+        """
+        tree = self.tree
+        if tree.parent1[self.id] == NO_ID or tree.parent2[self.id] == NO_ID:
+            return list()
+        half = set()
+        for parent in (tree.parent1[self.id], tree.parent2[self.id]):
+            for child in tree.children.targets(parent):
+                if self.is_half_sibling(ColumnarPerson(tree, child)):
+                    half.add(child)
+        return tree.get_names(half)
+
+    def is_child(self, person2):
+        tree = self.tree
+        if tree.parent1[self.id] == NO_ID or tree.parent2[self.id] == NO_ID:
+            return False
+        return tree.parent1[self.id] == person2.id or tree.parent2[self.id] == person2.id
+
+    def is_spouse(self, person2):
+        return self.tree.is_married(self.id, person2.id)
+
+    def is_sibling(self, person2):
+        tree = self.tree
+        if self.id == person2.id:
+            return False
+        elif tree.parent1[person2.id] == NO_ID or tree.parent2[person2.id] == NO_ID:
+            return False
+        parents2 = (tree.parent1[person2.id], tree.parent2[person2.id])
+        return tree.parent1[self.id] in parents2 or tree.parent2[self.id] in parents2
+
+    def is_full_sibling(self, person2):
+        tree = self.tree
+        if self.id == person2.id or tree.parent1[self.id] == NO_ID or tree.parent2[self.id] == NO_ID:
+            return False
+        parents1 = {tree.parent1[self.id], tree.parent2[self.id]}
+        return parents1 == {tree.parent1[person2.id], tree.parent2[person2.id]}
+
+    def is_half_sibling(self, person2):
+        return self.is_sibling(person2) and person2.is_sibling(self) and not self.is_full_sibling(person2)
+
+    def is_ancestor(self, person2):
+        return self.id in self.tree.get_ancestor_ids(person2.id)
+
+    def is_cousin(self, person2):
+        if self.id == person2.id:
+            return False
+        elif self.is_child(person2) or person2.is_child(self):
+            return False
+        ancestors1 = self.tree.get_ancestor_ids(self.id)
+        ancestors2 = self.tree.get_ancestor_ids(person2.id)
+        if person2.id in ancestors1 or self.id in ancestors2:
+            return False
+        return not ancestors1.isdisjoint(ancestors2)
+
+    def is_unrelated(self, person2):
+        if self.id == person2.id:
+            return True
+        elif self.is_child(person2) or person2.is_child(self):
+            return False
+        elif self.is_sibling(person2):
+            return False
+        elif self.is_cousin(person2):
+            return False
+        elif self.is_ancestor(person2) or person2.is_ancestor(self):
+            return False
+        else:
+            return True
+
+    def equals(self, person2):
+        return self.get_name() == person2.get_name()
+
+
+class Adjacency:
+    def __init__(self):
+        """
+        A list of edges per person, stored as singly linked lists threaded through
+        flat arrays. Linking is O(1) and costs two integers per edge.
+        """
+        self.head = array('l')  # id -> first edge, or NO_ID
+        self.target = array('l')  # edge -> id
+        self.next = array('l')  # edge -> next edge of the same source, or NO_ID
+
+    def grow(self):
+        self.head.append(NO_ID)
+
+    def link(self, source, target):
+        self.target.append(target)
+        self.next.append(self.head[source])
+        self.head[source] = len(self.target) - 1
+
+    def targets(self, source):
+        """
+        :param source: int
+        :return: list of ints, most recently linked first
+        """
+        result = list()
+        edge = self.head[source]
+        while edge != NO_ID:
+            result.append(self.target[edge])
+            edge = self.next[edge]
+        return result
+
+
+class ColumnarFamilyTree:
+    def __init__(self):
+        """
+        Names are interned once and given dense IDs in the order people are added,
+        so parents always have smaller IDs than their children.
+        """
+        self.names = list()  # id -> String
+        self.ids = {}  # String -> id
+        self.parent1 = array('l')  # id -> id, or NO_ID
+        self.parent2 = array('l')  # id -> id, or NO_ID
+        self.children = Adjacency()
+        self.spouses = Adjacency()
+        self.marriages = set()  # marriage_key ints, for constant-time spouse checks
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        """
+        Iterate over the names in the tree, in ID order.
+        """
+        return iter(self.names)
+
+    @staticmethod
+    def marriage_key(id1, id2):
+        """
+        Pack an ordered pair of IDs into one int.
+        """
+        return id1 << 32 | id2
+
+    def is_married(self, id1, id2):
+        return self.marriage_key(id1, id2) in self.marriages
+
+    def handle(self, id):
+        if id == NO_ID:
+            return None
+        return ColumnarPerson(self, id)
+
+    def get_names(self, ids):
+        """
+        :param ids: iterable of ints
+        :return: sorted list of strings
+        """
+        names = self.names
+        return sorted(names[id] for id in ids)
+
+    def create_person(self, name, parent1, parent2):
+        """
+        Add a new person to the tree, and return a handle on them.
+        If the person has no parents, the parent arguments should be None.
+
+        :param name: String
+        :param parent1: ColumnarPerson
+        :param parent2: ColumnarPerson
+        :return: ColumnarPerson
+        """
+        name = sys.intern(name)
+        id = len(self.names)
+        self.names.append(name)
+        self.ids[name] = id
+        self.parent1.append(NO_ID if parent1 is None else parent1.id)
+        self.parent2.append(NO_ID if parent2 is None else parent2.id)
+        self.children.grow()
+        self.spouses.grow()
+        return ColumnarPerson(self, id)
+
+    def add_person(self, person):
+        """
+        Copy a Person into the tree. Their parents must already be in the tree.
+
+        :param person: Person
+        :return: None
+        """
+        parent1 = person.get_parent1()
+        parent2 = person.get_parent2()
+        self.create_person(person.get_name(),
+                           None if parent1 is None else self.get_person(parent1.get_name()),
+                           None if parent2 is None else self.get_person(parent2.get_name()))
+
+    def get_person(self, name):
+        """
+        Return a handle on the person with the given name.
+        If that name is not in the tree, return None
+
+        :param name:
+        :return: ColumnarPerson
+        """
+        id = self.ids.get(name)
+        if id is None:
+            return None
+        return ColumnarPerson(self, id)
+
+    def get_ancestor_ids(self, id):
+        """
+        Walk up the parent columns and gather every direct ancestor once.
+
+        :param id: int
+        :return: set of ints
+        """
+        ancestors = set()
+        frontier = [id]
+        while frontier:
+            person = frontier.pop()
+            parent1 = self.parent1[person]
+            parent2 = self.parent2[person]
+            if parent1 == NO_ID or parent2 == NO_ID:
+                continue
+            for parent in (parent1, parent2):
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    frontier.append(parent)
+        return ancestors
+
+    def get_descendant_ids(self, ids):
+        """
+        Walk down the child lists from the given people, visiting each descendant once.
+
+        :param ids: iterable of ints
+        :return: set of ints
+        """
+        descendants = set()
+        frontier = list(ids)
+        while frontier:
+            for child in self.children.targets(frontier.pop()):
+                if child not in descendants:
+                    descendants.add(child)
+                    frontier.append(child)
+        return descendants
+
+    def iter_descendant_generations(self, person, depth=None):
+        """
+        Walk down the child lists one generation at a time, listing each
+        descendant once, in the nearest generation they appear in.
+
+        :param person: ColumnarPerson
+        :param depth: int, the most generations to walk, or None for all
+        :return: A generator of sorted lists of strings, one per generation
+        """
+        seen = set()
+        generation = [person.id]
+        while generation and (depth is None or depth > 0):
+            children = list()
+            for parent in generation:
+                for child in self.children.targets(parent):
+                    if child not in seen:
+                        seen.add(child)
+                        children.append(child)
+            if children:
+                yield self.get_names(children)
+            generation = children
+            if depth is not None:
+                depth -= 1
+
+    def iter_ancestor_generations(self, person, depth=None):
+        """
+        Walk up the parent columns one generation at a time, listing each
+        ancestor once, in the nearest generation they appear in.
+
+        :param person: ColumnarPerson
+        :param depth: int, the most generations to walk, or None for all
+        :return: A generator of sorted lists of strings, one per generation
+        """
+        seen = set()
+        generation = [person.id]
+        while generation and (depth is None or depth > 0):
+            parents = list()
+            for child in generation:
+                if self.parent1[child] == NO_ID or self.parent2[child] == NO_ID:
+                    continue
+                for parent in (self.parent1[child], self.parent2[child]):
+                    if parent not in seen:
+                        seen.add(parent)
+                        parents.append(parent)
+            if parents:
+                yield self.get_names(parents)
+            generation = parents
+            if depth is not None:
+                depth -= 1
+
+    def get_cousins(self, person):
+        """
+        Walk down from each ancestor of the given person, and keep everyone reached
+        who is not the person, one of their ancestors, or one of their descendants.
+
+        :param person: ColumnarPerson
+        :return: list of strings
+        """
+        ancestors = self.get_ancestor_ids(person.id)
+        cousins = self.get_descendant_ids(ancestors)
+        cousins -= ancestors
+        cousins -= self.get_descendant_ids((person.id,))
+        cousins.discard(person.id)
+        return self.get_names(cousins)
+
+    def is_unrelated(self, person1, person2):
+        return person1.is_unrelated(person2)
+
+    def get_unrelated(self, person):
+        """
+        Compute the set of people related to the given person once,
+        and return everyone else in the tree.
+
+        :param person: ColumnarPerson
+        :return: list of strings
+        """
+        ancestors = self.get_ancestor_ids(person.id)
+        related = self.get_descendant_ids(list(ancestors) + [person.id])
+        related |= ancestors
+        related.discard(person.id)
+        return self.get_names(id for id in range(len(self.names)) if id not in related)
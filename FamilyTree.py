@@ -5,12 +5,35 @@ A class to keep track of and manage a family tree of Person objects
 """
 
 
+from Person import Person
+from Reachability import ReachabilityIndex
+
+
 class FamilyTree:
     def __init__(self):
         """
-        A Family tree is simply a dictionary with strings as keys and Persons as values
+        A Family tree is simply a dictionary with strings as keys and Persons as values.
+        Descendants are walked through each Person's children directly, without
+        looking anyone up by name. The tree can also keep a reachability index
+        for ancestor checks.
+
+        Everyone is also kept in a union-find of blood components: a child joins
+        the component of their parents, and marriages join nothing. People in
+        different components cannot be related at all.
         """
         self.tree = {}
+        self.reachability = None  # ReachabilityIndex
+        self.component_parents = {}  # String -> String, leading to the component's root
+        self.components = {}  # String root -> List of Strings of the component's members
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __iter__(self):
+        """
+        Iterate over the names in the tree, in the order they were added.
+        """
+        return iter(self.tree)
 
     def add_person(self, person):
         """
@@ -20,6 +43,84 @@ class FamilyTree:
         :return:
         """
         self.tree[person.get_name()] = person
+        self.component_parents[person.get_name()] = person.get_name()
+        self.components[person.get_name()] = [person.get_name()]
+        if person.get_parent1() is not None and person.get_parent2() is not None:
+            self.join_components(person.get_name(), person.get_parent1().get_name())
+            self.join_components(person.get_name(), person.get_parent2().get_name())
+        if self.reachability is not None:
+            self.reachability.add(person)
+
+    def find_component(self, name):
+        """
+        Find the root of the person's blood component, pointing everyone passed
+        on the way straight at it.
+
+        :param name: String
+        :return: String
+        """
+        parents = self.component_parents
+        root = name
+        while parents[root] != root:
+            root = parents[root]
+        while parents[name] != root:
+            parents[name], name = root, parents[name]
+        return root
+
+    def join_components(self, name1, name2):
+        """
+        Merge the blood components of two people, moving the smaller member list
+        into the larger.
+
+        :param name1: String
+        :param name2: String
+        :return: None
+        """
+        root1 = self.find_component(name1)
+        root2 = self.find_component(name2)
+        if root1 == root2:
+            return
+        if len(self.components[root1]) < len(self.components[root2]):
+            root1, root2 = root2, root1
+        self.component_parents[root2] = root1
+        self.components[root1].extend(self.components.pop(root2))
+
+    def enable_reachability(self):
+        """
+        Build a reachability index over everyone in the tree. From then on it is
+        kept up to date as people are added.
+
+        :return: ReachabilityIndex
+        """
+        if self.reachability is None:
+            self.reachability = ReachabilityIndex()
+            for person in self.tree.values():
+                self.reachability.add(person)
+        return self.reachability
+
+    def create_person(self, name, parent1, parent2):
+        """
+        Create a new person and add them to the tree.
+        If the person has no parents, the parent arguments should be None.
+
+        :param name: String
+        :param parent1: Person
+        :param parent2: Person
+        :return: Person
+        """
+        person = Person(name, parent1, parent2)
+        self.add_person(person)
+        return person
+
+    def save_snapshot(self, path):
+        """
+        Write the tree to a binary snapshot that SnapshotTree can memory-map.
+
+        :param path: String
+        :return: None
+        """
+        from Snapshot import save_snapshot
+        save_snapshot(self, path)
 
     def get_person(self, name):
         """
@@ -34,30 +135,133 @@ class FamilyTree:
         else:
             return self.tree[name]
 
+    def get_descendant_set(self, people):
+        """
+        Walk down through the children of the given people, and gather the set
+        of everyone descended from at least one of them. Each descendant is
+        visited once, however many of the given people they descend from.
+
+        :param people: iterable of Persons
+        :return: set of strings
+        """
+        descendants = set()
+        frontier = list(people)
+        while frontier:
+            person = frontier.pop()
+            for child in person.children:
+                if child.get_name() not in descendants:
+                    descendants.add(child.get_name())
+                    frontier.append(child)
+        return descendants
+
+    def iter_descendant_generations(self, person, depth=None):
+        """
+        Walk down through the children one generation at a time. Each descendant is
+        listed once, in the nearest generation they appear in, so a caller that
+        only wants the first few is never made to walk the rest.
+
+        :param person: Person
+        :param depth: int, the most generations to walk, or None for all
+        :return: A generator of sorted lists of strings, one per generation
+        """
+        seen = set()
+        generation = [person]
+        while generation and (depth is None or depth > 0):
+            children = list()
+            for parent in generation:
+                for child in parent.children:
+                    if child.get_name() not in seen:
+                        seen.add(child.get_name())
+                        children.append(child)
+            if children:
+                yield sorted(child.get_name() for child in children)
+            generation = children
+            if depth is not None:
+                depth -= 1
+
+    def iter_ancestor_generations(self, person, depth=None):
+        """
+        Walk up through the parents one generation at a time, listing each
+        ancestor once, in the nearest generation they appear in.
+
+        :param person: Person
+        :param depth: int, the most generations to walk, or None for all
+        :return: A generator of sorted lists of strings, one per generation
+        """
+        seen = set()
+        generation = [person]
+        while generation and (depth is None or depth > 0):
+            parents = list()
+            for child in generation:
+                if child.get_parent1() is None or child.get_parent2() is None:
+                    continue
+                for parent in (child.get_parent1(), child.get_parent2()):
+                    if parent.get_name() not in seen:
+                        seen.add(parent.get_name())
+                        parents.append(parent)
+            if parents:
+                yield sorted(parent.get_name() for parent in parents)
+            generation = parents
+            if depth is not None:
+                depth -= 1
+
     def get_cousins(self, person):
         """
-        Iterate through every member of the tree and check if they are a cousin of the given person.
+        Walk down from each ancestor of the given person. Everyone reached is a cousin,
+        unless they are the person, one of their ancestors, or one of their descendants.
 
         :param person:
         :return: list of strings
         """
-        cousins = list()
-        for entry in self.tree:
-            if person.is_cousin(self.tree[entry]):
-                cousins.append(entry)
-        cousins.sort()
-        return cousins
+        ancestors = person.get_ancestor_set()
+        cousins = self.get_descendant_set(self.tree[name] for name in ancestors)
+        cousins -= ancestors
+        cousins -= self.get_descendant_set((person,))
+        cousins.discard(person.get_name())
+        return sorted(cousins)
+
+    def get_related_set(self, person):
+        """
+        Gather everyone related to the given person: their ancestors, their descendants,
+        and everyone descended from one of their ancestors (siblings and cousins).
+        The person is not related to themselves.
+
+        :param person:
+        :return: set of strings
+        """
+        ancestors = person.get_ancestor_set()
+        related = self.get_descendant_set([self.tree[name] for name in ancestors] + [person])
+        related |= ancestors
+        related.discard(person.get_name())
+        return related
+
+    def is_unrelated(self, person1, person2):
+        """
+        Check if two people are not related at all. People in different blood
+        components are answered at once, without walking their ancestors.
+
+        :param person1: Person
+        :param person2: Person
+        :return: Boolean
+        """
+        if self.find_component(person1.get_name()) != self.find_component(person2.get_name()):
+            return True
+        return person1.is_unrelated(person2)
 
     def get_unrelated(self, person):
         """
-        Iterate through every member of the tree and check if they are unrelated to the given person.
+        Compute the set of people related to the given person once, and return
+        everyone else in the tree. Only the person's own blood component is
+        checked; every other component is unrelated as a whole.
 
         :param person:
         :return: list of strings
         """
-        unrelated = list()
-        for entry in self.tree:
-            if person.is_unrelated(self.tree[entry]):
-                unrelated.append(entry)
+        related = self.get_related_set(person)
+        own = self.find_component(person.get_name())
+        unrelated = [name for name in self.components[own] if name not in related]
+        for root, members in self.components.items():
+            if root != own:
+                unrelated.extend(members)
         unrelated.sort()
         return unrelated
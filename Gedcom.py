@@ -0,0 +1,229 @@
+"""
+A streaming GEDCOM importer that builds a FamilyTree directly, then answers
+queries from standard input like main.py
+"""
+
+
+import argparse
+import sys
+import time
+import main
+from FamilyTree import FamilyTree
+from Snapshot import save_snapshot
+
+
+# The level 1 tags that link people and families
+LINKS = ('FAMC', 'HUSB', 'WIFE')
+
+
+def read_records(lines, tags=LINKS):
+    """
+    Group GEDCOM lines into level 0 records, one record at a time. Only the
+    level 1 lines with the given tags are kept, which is all the importer needs.
+
+    :param lines: iterable of strings
+    :param tags: collection of strings
+    :return: A generator of (String, String, list of (String, String)) tuples of
+             the record's cross-reference ID, its tag, and its kept tags and values
+    """
+    record = None
+    for line in lines:
+        line = line.lstrip()
+        if line.startswith('1 '):
+            if record is not None:
+                tag, _, value = line[2:].partition(' ')
+                if tag in tags:
+                    record[2].append((tag, value.strip().strip('@')))
+        elif line.startswith('0 '):
+            if record is not None:
+                yield record
+            words = line.split()
+            if len(words) >= 3 and words[1].startswith('@'):
+                record = (words[1].strip('@'), words[2], list())
+            else:
+                record = None
+    if record is not None:
+        yield record
+
+
+class GedcomLoader:
+    def __init__(self, tree):
+        """
+        People are named by their GEDCOM IDs, since names in the file need not be
+        unique or free of spaces. A person joins the tree as soon as their parents
+        have, so parents always come before their children, whatever order the
+        file is in. Until then the pending family links are held: people waiting
+        on a family, and families waiting on a parent. The parents of every
+        resolved family are also kept until the end, since a child's record may
+        come anywhere later in the file.
+
+        Children and spouses are appended unsorted and sorted once in finish.
+
+        :param tree: FamilyTree, empty
+        """
+        self.tree = tree
+        self.records = 0
+        self.families = 0
+        self.resolved = {}  # family ID -> (Person, Person) or None for one known parent
+        self.pending = {}  # family ID -> (String, String) of parents not yet all in the tree
+        self.waiting = {}  # family ID -> List of Strings of children
+        self.blocked = {}  # String -> List of family IDs waiting on that parent
+
+    def add_record(self, xref, tag, lines):
+        """
+        :param xref: String
+        :param tag: String
+        :param lines: list of (String, String) tuples
+        :return: None
+        """
+        self.records += 1
+        if tag == 'INDI':
+            family = next((value for line_tag, value in lines if line_tag == 'FAMC'), None)
+            if family is None:
+                self.place(xref, None)
+            elif family in self.resolved:
+                self.place(xref, family)
+            else:
+                self.waiting.setdefault(family, list()).append(xref)
+        elif tag == 'FAM':
+            self.families += 1
+            parents = [value for line_tag, value in lines if line_tag in ('HUSB', 'WIFE')]
+            if len(parents) != 2:
+                self.resolve(xref, None)
+                return
+            missing = [parent for parent in parents if self.tree.get_person(parent) is None]
+            if missing:
+                self.pending[xref] = tuple(parents)
+                for parent in missing:
+                    self.blocked.setdefault(parent, list()).append(xref)
+            else:
+                self.resolve(xref, tuple(parents))
+
+    def place(self, name, family):
+        """
+        Add a person to the tree, under the family they are a child of, and then
+        everyone who was only waiting for them.
+
+        :param name: String
+        :param family: String, a resolved family ID, or None
+        :return: None
+        """
+        ready = [(name, family)]
+        while ready:
+            name, family = ready.pop()
+            if self.tree.get_person(name) is not None:
+                continue
+            parents = self.resolved.get(family)
+            if parents is None:
+                person = self.tree.create_person(name, None, None)
+            else:
+                person = self.tree.create_person(name, parents[0], parents[1])
+                parents[0].append_child(person)
+                parents[1].append_child(person)
+            for blocked in self.blocked.pop(name, ()):
+                if blocked in self.pending \
+                        and all(self.tree.get_person(parent) is not None for parent in self.pending[blocked]):
+                    ready.extend(self.resolve(blocked, self.pending.pop(blocked), place=False))
+
+    def resolve(self, family, parents, place=True):
+        """
+        Marry the family's parents, who are both in the tree, and release the
+        children waiting on the family.
+
+        :param family: String
+        :param parents: (String, String), or None if the family lacks a parent
+        :param place: Boolean, False to return the children instead of placing them
+        :return: list of (String, String) tuples of children and the family
+        """
+        if parents is None:
+            self.resolved[family] = None
+        else:
+            parent1 = self.tree.get_person(parents[0])
+            parent2 = self.tree.get_person(parents[1])
+            parent1.append_spouse(parent2)
+            parent2.append_spouse(parent1)
+            self.resolved[family] = (parent1, parent2)
+        children = [(child, family) for child in self.waiting.pop(family, ())]
+        if place:
+            for child, child_family in children:
+                self.place(child, child_family)
+        return children
+
+    def finish(self):
+        """
+        Add the parents who never had records of their own as people without
+        parents, which may resolve more families, until there are none left.
+        Only then is anyone still waiting on a family that has no record added
+        without parents, since adding them may resolve other families in turn.
+        Finally, sort every child and spouse list once.
+
+        :return: None
+        """
+        while self.pending or self.waiting:
+            waiting = {child for children in self.waiting.values() for child in children}
+            missing = [parent for parents in self.pending.values() for parent in parents
+                       if self.tree.get_person(parent) is None and parent not in waiting]
+            if missing:
+                for parent in missing:
+                    self.place(parent, None)
+                continue
+            # Everyone the pending families lack is waiting on a family in turn
+            orphaned = [family for family in self.waiting if family not in self.pending]
+            for family in orphaned:
+                for child in self.waiting.pop(family):
+                    self.place(child, None)
+            if not orphaned:
+                # The families wait on each other in a cycle, so break it at one parent
+                parents = next(iter(self.pending.values()))
+                self.place(next(parent for parent in parents if self.tree.get_person(parent) is None), None)
+        for name in self.tree:
+            self.tree.get_person(name).sort_family()
+
+
+def load_gedcom(path, tree, progress=None, every=100000):
+    """
+    Read a GEDCOM file a line at a time into the tree.
+
+    :param path: String
+    :param tree: FamilyTree, empty
+    :param progress: file to report records per second to, or None
+    :param every: int, records between progress reports
+    :return: GedcomLoader
+    """
+    loader = GedcomLoader(tree)
+    start = time.perf_counter()
+    with open(path, encoding='utf-8-sig', errors='replace') as gedcom:
+        for xref, tag, lines in read_records(gedcom):
+            loader.add_record(xref, tag, lines)
+            if progress is not None and loader.records % every == 0:
+                print_progress(loader, time.perf_counter() - start, progress)
+    loader.finish()
+    if progress is not None:
+        print_progress(loader, time.perf_counter() - start, progress)
+    return loader
+
+
+def print_progress(loader, elapsed, out):
+    print('%d records (%d people, %d families) in %.1f s, %.0f records/s'
+          % (loader.records, len(loader.tree), loader.families, elapsed,
+             loader.records / elapsed if elapsed > 0 else 0.0), file=out)
+    out.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load a GEDCOM file, then answer family tree queries '
+                                                 'read from standard input.')
+    parser.add_argument('gedcom', help='the GEDCOM file; people are named by their GEDCOM IDs')
+    parser.add_argument('--save-snapshot', metavar='PATH',
+                        help='write the loaded tree to a binary snapshot')
+    parser.add_argument('--no-queries', action='store_true',
+                        help='stop once the file is loaded instead of reading queries')
+    parser.add_argument('--quiet', action='store_true',
+                        help='do not report loading progress on standard error')
+    args = parser.parse_args()
+    tree = FamilyTree()
+    load_gedcom(args.gedcom, tree, None if args.quiet else sys.stderr)
+    if args.save_snapshot is not None:
+        save_snapshot(tree, args.save_snapshot)
+    if not args.no_queries:
+        main.main(tree)
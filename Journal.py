@@ -0,0 +1,144 @@
+"""
+An append-only journal of E events, folded into snapshots from time to time,
+so a tree can be rebuilt after a crash
+"""
+
+
+import os
+import re
+from Snapshot import load_snapshot, save_snapshot
+
+
+# Segment k is a base snapshot holding every event before it and a journal of
+# the events since. Generation 0 has no base.
+BASE = 'base-%d.snap'
+LOG = 'journal-%d.log'
+BASE_PATTERN = re.compile(r'base-(\d+)\.snap$')
+
+
+def sync_directory(directory):
+    """
+    Make renames and new files in the directory durable.
+
+    :param directory: String
+    :return: None
+    """
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class Journal:
+    def __init__(self, directory, sync_every=1000, compact_every=0):
+        """
+        E queries are appended to the current journal exactly as they were read,
+        and written to disk together every sync_every events, so a crash loses at
+        most that many. Every compact_every events the whole tree is saved as the
+        next base snapshot and a new, empty journal is started, so recovery
+        only ever replays a bounded tail.
+
+        :param directory: String, created if it does not exist
+        :param sync_every: int
+        :param compact_every: int, or 0 to only compact when asked
+        """
+        self.directory = directory
+        self.sync_every = sync_every
+        self.compact_every = compact_every
+        self.tree = None
+        self.generation = 0
+        self.log = None
+        self.unsynced = 0
+        self.since_compaction = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, pattern, generation):
+        return os.path.join(self.directory, pattern % generation)
+
+    def latest_generation(self):
+        generations = [int(match.group(1)) for match in map(BASE_PATTERN.match, os.listdir(self.directory))
+                       if match is not None]
+        return max(generations, default=0)
+
+    def recover(self, tree, add_event):
+        """
+        Load the newest base snapshot into the empty tree and replay the journal
+        written since. A last line cut short by a crash is dropped. Afterwards
+        new events are appended to the same journal.
+
+        :param tree: FamilyTree or ColumnarFamilyTree, empty
+        :param add_event: function that applies one E query, as main.add_event
+        :return: int, the number of events replayed
+        """
+        self.tree = tree
+        self.generation = self.latest_generation()
+        if self.generation > 0:
+            load_snapshot(self.path(BASE, self.generation), tree)
+
+        replayed = 0
+        log_path = self.path(LOG, self.generation)
+        if os.path.exists(log_path):
+            with open(log_path, 'r+b') as log:
+                data = log.read()
+                complete = data.rfind(b'\n') + 1
+                if complete < len(data):
+                    log.truncate(complete)
+            with open(os.devnull, 'w') as discard:
+                for line in data[:complete].decode('utf-8').splitlines(keepends=True):
+                    add_event(tree, line, line[:-1].split(' '), discard)
+                    replayed += 1
+        self.since_compaction = replayed
+        self.log = open(log_path, 'a', encoding='utf-8')
+        return replayed
+
+    def append(self, query):
+        """
+        Record one E query that has been applied to the tree.
+
+        :param query: String, ending in a newline
+        :return: None
+        """
+        self.log.write(query if query.endswith('\n') else query + '\n')
+        self.unsynced += 1
+        self.since_compaction += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+        if self.compact_every and self.since_compaction >= self.compact_every:
+            self.compact()
+
+    def sync(self):
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.unsynced = 0
+
+    def compact(self):
+        """
+        Save the tree as the next base snapshot, start an empty journal, and
+        remove the previous segment. The base is written under a temporary name
+        and renamed into place, so a crash leaves either segment whole.
+
+        :return: None
+        """
+        self.sync()
+        generation = self.generation + 1
+        base_path = self.path(BASE, generation)
+        save_snapshot(self.tree, base_path + '.tmp')
+        with open(base_path + '.tmp', 'rb') as base:
+            os.fsync(base.fileno())
+        os.replace(base_path + '.tmp', base_path)
+        sync_directory(self.directory)
+
+        self.log.close()
+        self.log = open(self.path(LOG, generation), 'a', encoding='utf-8')
+        for old in (self.path(BASE, self.generation), self.path(LOG, self.generation)):
+            if os.path.exists(old):
+                os.remove(old)
+        self.generation = generation
+        self.since_compaction = 0
+
+    def close(self):
+        if self.log is not None:
+            self.sync()
+            self.log.close()
+            self.log = None
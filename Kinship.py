@@ -0,0 +1,214 @@
+"""
+Kinship and inbreeding coefficients from the standard pedigree recursion
+"""
+
+
+import threading
+import weakref
+from itertools import islice
+
+
+# Pairs remembered between queries before the memo is started over
+MEMO_LIMIT = 5000000
+
+# The Kinship of each tree, made on first use
+kinships = weakref.WeakKeyDictionary()
+kinships_lock = threading.Lock()
+
+
+def get_kinship(tree):
+    """
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :return: Kinship, shared by every query on the tree
+    """
+    with kinships_lock:
+        kinship = kinships.get(tree)
+        if kinship is None:
+            kinship = kinships[tree] = Kinship(tree)
+        return kinship
+
+
+class Kinship:
+    def __init__(self, tree):
+        """
+        The kinship coefficient of two people is the chance that an allele drawn
+        from each is identical by descent. With people numbered in the order they
+        were added, so parents come before their children:
+
+            phi(a, a) = (1 + phi(father, mother)) / 2, or 1/2 for a founder
+            phi(a, b) = (phi(father of a, b) + phi(mother of a, b)) / 2 for a after b,
+                        or 0 if a is a founder
+
+        Always expanding the later person keeps the recursion from climbing past a
+        shared ancestor. Each pair is computed once and remembered, so pedigree
+        collapse costs nothing extra, and a pedigree never changes once its people
+        exist, so nothing is ever invalidated.
+
+        Queries may come from several threads at once, as in the server, while
+        the tree itself is only read. The numbering and the memo are only
+        touched under the lock.
+
+        :param tree: FamilyTree or ColumnarFamilyTree
+        """
+        self.tree = tree
+        self.lock = threading.Lock()
+        self.index = {}  # String -> int
+        self.parents = list()  # int -> (int, int), or None for a founder
+        self.memo = {}  # (int, int), later first -> float
+
+    def refresh(self):
+        """
+        Number everyone who joined the tree since the last refresh.
+
+        :return: None
+        """
+        if len(self.parents) == len(self.tree):
+            return
+        for name in islice(self.tree, len(self.parents), None):
+            person = self.tree.get_person(name)
+            parent1 = person.get_parent1()
+            parent2 = person.get_parent2()
+            self.index[name] = len(self.parents)
+            if parent1 is None or parent2 is None:
+                self.parents.append(None)
+            else:
+                self.parents.append((self.index[parent1.get_name()], self.index[parent2.get_name()]))
+
+    def coefficient(self, id1, id2):
+        """
+        Compute one kinship coefficient without recursion. A pair is only
+        finished once both of the pairs it depends on are.
+
+        :param id1: int
+        :param id2: int
+        :return: float
+        """
+        memo = self.memo
+        stack = [(max(id1, id2), min(id1, id2))]
+        while stack:
+            pair = stack[-1]
+            if pair in memo:
+                stack.pop()
+                continue
+            later, earlier = pair
+            parents = self.parents[later]
+            if parents is None:
+                memo[pair] = 0.5 if later == earlier else 0.0
+                stack.pop()
+                continue
+            if later == earlier:
+                needed = ((max(parents), min(parents)),)
+            else:
+                needed = tuple((max(parent, earlier), min(parent, earlier)) for parent in parents)
+            missing = [sub for sub in needed if sub not in memo]
+            if missing:
+                stack.extend(missing)
+            elif later == earlier:
+                memo[pair] = 0.5 * (1 + memo[needed[0]])
+                stack.pop()
+            else:
+                memo[pair] = 0.5 * (memo[needed[0]] + memo[needed[1]])
+                stack.pop()
+        return memo[(max(id1, id2), min(id1, id2))]
+
+    def get_kinship(self, name1, name2):
+        """
+        :param name1: String
+        :param name2: String
+        :return: float
+        """
+        with self.lock:
+            self.refresh()
+            if len(self.memo) > MEMO_LIMIT:
+                self.memo.clear()
+            return self.coefficient(self.index[name1], self.index[name2])
+
+    def get_inbreeding(self, name):
+        """
+        The inbreeding coefficient of a person is the kinship of their parents.
+
+        :param name: String
+        :return: float
+        """
+        with self.lock:
+            self.refresh()
+            parents = self.parents[self.index[name]]
+            if parents is None:
+                return 0.0
+            if len(self.memo) > MEMO_LIMIT:
+                self.memo.clear()
+            return self.coefficient(parents[0], parents[1])
+
+    def closure(self, ids):
+        """
+        :param ids: iterable of ints
+        :return: sorted list of the ints and all of their ancestors
+        """
+        seen = set(ids)
+        frontier = list(seen)
+        while frontier:
+            parents = self.parents[frontier.pop()]
+            for parent in parents or ():
+                if parent not in seen:
+                    seen.add(parent)
+                    frontier.append(parent)
+        return sorted(seen)
+
+    def score_cohort(self, proband, cohort):
+        """
+        Compute the kinship of one person with many in a single pass. For every
+        ancestor of the proband, in order, a column of kinships with everyone in
+        the cohort's pedigree is filled from columns already built, and a column
+        is dropped once every child that needs it is done.
+
+        That pass costs the proband's lineage times the whole pedigree, while
+        each pair from coefficient costs about the lineage, and the memo is
+        shared. So the pass is only made when the cohort outnumbers the lineage,
+        and a smaller cohort is scored a pair at a time.
+
+        :param proband: String
+        :param cohort: list of strings
+        :return: list of floats, in cohort order
+        """
+        with self.lock:
+            self.refresh()
+        proband_id = self.index[proband]
+        lineage = self.closure((proband_id,))
+        if len(cohort) <= len(lineage):
+            with self.lock:
+                if len(self.memo) > MEMO_LIMIT:
+                    self.memo.clear()
+                return [self.coefficient(proband_id, self.index[name]) for name in cohort]
+        pedigree = self.closure([proband_id] + [self.index[name] for name in cohort])
+        uses = dict.fromkeys(lineage, 0)
+        uses[proband_id] = 1
+        for ancestor in lineage:
+            for parent in self.parents[ancestor] or ():
+                uses[parent] += 1
+
+        columns = {}  # int -> dict of int -> float
+        for ancestor in lineage:
+            own_parents = self.parents[ancestor]
+            column = {}
+            for other in pedigree:
+                if other == ancestor:
+                    if own_parents is None:
+                        column[other] = 0.5
+                    else:
+                        column[other] = 0.5 * (1 + columns[own_parents[0]][own_parents[1]])
+                elif other > ancestor:
+                    other_parents = self.parents[other]
+                    if other_parents is None:
+                        column[other] = 0.0
+                    else:
+                        column[other] = 0.5 * (column[other_parents[0]] + column[other_parents[1]])
+                elif own_parents is None:
+                    column[other] = 0.0
+                else:
+                    column[other] = 0.5 * (columns[own_parents[0]][other] + columns[own_parents[1]][other])
+            columns[ancestor] = column
+            for parent in own_parents or ():
+                uses[parent] -= 1
+                if uses[parent] == 0:
+                    del columns[parent]
+        return [columns[proband_id][self.index[name]] for name in cohort]
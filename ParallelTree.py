@@ -0,0 +1,205 @@
+"""
+A family tree that spreads the descendant walks behind W cousin and
+W unrelated over a pool of worker processes
+"""
+
+
+import mmap
+import multiprocessing
+import os
+from array import array
+from FamilyTree import FamilyTree
+
+
+# The tree's people by name, and the position of each name, as they were when
+# the worker processes were forked. Workers walk them directly, so they are
+# never pickled.
+shared_tree = None
+shared_positions = None
+
+# One byte per position, set when some worker claims that person during a walk.
+# The map is shared with the workers rather than copied when they are forked.
+shared_flags = None
+
+
+def walk_descendants(names):
+    """
+    Worker task: walk down from the given people through the tree as it was
+    at the fork, claiming everyone reached who no worker has claimed yet.
+    Workers walking from other people skip whoever is already claimed, so
+    each descendant is walked past about once in all.
+
+    :param names: list of strings of people to walk down from
+    :return: bytes of an array('l') of the positions this worker claimed
+    """
+    claimed = array('l')
+    frontier = [shared_tree[name] for name in names]
+    while frontier:
+        person = frontier.pop()
+        for child in person.children:
+            position = shared_positions[child.get_name()]
+            if not shared_flags[position]:
+                shared_flags[position] = 1
+                claimed.append(position)
+                frontier.append(child)
+    return claimed.tobytes()
+
+
+def usable_cpus():
+    """
+    :return: int, the number of CPUs this process may run on
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class ParallelFamilyTree(FamilyTree):
+    # The pool is forked again once this share of the tree has joined since the last fork
+    REFORK_SHARE = 0.1
+
+    def __init__(self, workers, threshold):
+        """
+        A query is answered serially when the person's blood component has fewer
+        than threshold people, since no walk can then reach more than that, and
+        every query is when fewer than two CPUs are usable. Otherwise the parent
+        still starts the walk itself, and only hands it over once it has reached
+        threshold people, so short walks never pay for the workers.
+
+        The person's ancestors are dealt out among the workers, which
+        walk down from them at once through the tree as it was at the fork. A
+        shared flag column records who has been reached, so the workers split
+        the walk between them, and each sends back only the positions it
+        claimed. Everyone who joined since the fork is a child of people already
+        reached or of ancestors, so the parent finishes the walk over them in
+        the order they were added. The pool is only forked again once they reach
+        REFORK_SHARE of the tree.
+
+        :param workers: int
+        :param threshold: int
+        """
+        super().__init__()
+        self.workers = min(workers, usable_cpus())
+        self.threshold = threshold
+        self.pool = None
+        self.names = list()  # Strings, the name at each position in shared_flags
+        self.added = list()  # Persons added since the pool was forked
+
+    def create_person(self, name, parent1, parent2):
+        person = super().create_person(name, parent1, parent2)
+        if self.pool is not None:
+            self.added.append(person)
+        return person
+
+    def is_parallel(self, person):
+        return self.workers > 1 \
+            and len(self.components[self.find_component(person.get_name())]) >= self.threshold
+
+    def get_pool(self):
+        global shared_tree, shared_positions, shared_flags
+        if self.pool is not None and len(self.added) <= self.REFORK_SHARE * len(self.names):
+            return self.pool
+        self.close()
+        shared_tree = self.tree
+        self.names = list(self.tree)
+        shared_positions = {name: position for position, name in enumerate(self.names)}
+        shared_flags = mmap.mmap(-1, max(1, len(self.names)))
+        self.added = list()
+        self.pool = multiprocessing.get_context('fork').Pool(self.workers)
+        return self.pool
+
+    def close(self):
+        """
+        Shut down the worker processes, if any are running.
+
+        :return: None
+        """
+        global shared_tree, shared_positions, shared_flags
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            shared_flags.close()
+            shared_tree = shared_positions = shared_flags = None
+            self.names = list()
+
+    def walk_serially(self, people):
+        """
+        Walk down from the given people in this process, giving up once the
+        walk has reached threshold people.
+
+        :param people: list of Persons
+        :return: set of strings, as from get_descendant_set, or None if the walk gave up
+        """
+        descendants = set()
+        frontier = list(people)
+        while frontier:
+            person = frontier.pop()
+            for child in person.children:
+                if child.get_name() not in descendants:
+                    descendants.add(child.get_name())
+                    frontier.append(child)
+            if len(descendants) >= self.threshold:
+                return None
+        return descendants
+
+    def spread_descendant_set(self, people):
+        """
+        Walk down from the given people in this process if the walk is short,
+        and otherwise in the workers, then through everyone added since the fork.
+
+        :param people: list of Persons
+        :return: set of strings, as from get_descendant_set
+        """
+        descendants = self.walk_serially(people)
+        if descendants is not None:
+            return descendants
+        pool = self.get_pool()
+        starts = {person.get_name() for person in people}
+        forked = [name for name in starts if name in shared_positions]
+        claimed = array('l')
+        try:
+            for part in pool.map(walk_descendants, [forked[worker::self.workers] for worker in range(self.workers)]):
+                claimed.frombytes(part)
+        finally:
+            for position in claimed:
+                shared_flags[position] = 0
+        descendants = {self.names[position] for position in claimed}
+        for person in self.added:
+            if person.get_parent1() is None or person.get_parent2() is None:
+                continue
+            for parent in (person.get_parent1().get_name(), person.get_parent2().get_name()):
+                if parent in descendants or parent in starts:
+                    descendants.add(person.get_name())
+                    break
+        return descendants
+
+    def get_cousins(self, person):
+        """
+        :param person:
+        :return: list of strings
+        """
+        if not self.is_parallel(person):
+            return super().get_cousins(person)
+        ancestors = person.get_ancestor_set()
+        cousins = self.spread_descendant_set([self.tree[name] for name in ancestors])
+        cousins -= ancestors
+        cousins -= self.get_descendant_set((person,))
+        cousins.discard(person.get_name())
+        return sorted(cousins)
+
+    def get_related_set(self, person):
+        """
+        W unrelated lists everyone outside this set, so it is spread over the
+        workers too, and the blood components still rule out everyone else.
+
+        :param person:
+        :return: set of strings
+        """
+        if not self.is_parallel(person):
+            return super().get_related_set(person)
+        ancestors = person.get_ancestor_set()
+        related = self.spread_descendant_set([self.tree[name] for name in ancestors] + [person])
+        related |= ancestors
+        related.discard(person.get_name())
+        return related
@@ -5,7 +5,128 @@ A class to support the members of a family tree
 """
 
 
+import heapq
+import sys
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from operator import attrgetter
+
+
+# Sort key for lists of Persons
+BY_NAME = attrgetter('name')
+
+
+class AncestorCache:
+    def __init__(self, capacity):
+        """
+        A least-recently-used cache of ancestor sets, keyed by Person.
+        The capacity is the total number of ancestor names held across
+        all cached sets, not the number of people. It is safe to share
+        between threads.
+
+        :param capacity: int
+        """
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.size = 0
+        self.entries = OrderedDict()  # Person -> frozenset of Strings
+
+    def get(self, person):
+        """
+        Return the cached ancestor set of the person, or None on a miss.
+
+        :param person: Person
+        :return: frozenset of strings
+        """
+        with self.lock:
+            ancestors = self.entries.get(person)
+            if ancestors is not None:
+                self.entries.move_to_end(person)
+            return ancestors
+
+    def put(self, person, ancestors):
+        """
+        Cache the ancestor set of the person, evicting the least recently
+        used sets until the cache fits within its capacity again.
+
+        :param person: Person
+        :param ancestors: frozenset of strings
+        :return: None
+        """
+        if len(ancestors) > self.capacity:
+            return
+        with self.lock:
+            old = self.entries.pop(person, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[person] = ancestors
+            self.size += len(ancestors)
+            while self.size > self.capacity:
+                evicted = self.entries.popitem(last=False)[1]
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FamilyUnit:
+    __slots__ = ('parent1', 'parent2', 'children')
+
+    def __init__(self, parent1, parent2):
+        """
+        One couple and the children they had together. Every child belongs to
+        exactly one unit, so full siblings are the other children of the unit
+        and half-siblings are the children of their parents' other units. The
+        units are the only record of anyone's children.
+
+        :param parent1: Person
+        :param parent2: Person
+        """
+        self.parent1 = parent1  # Person
+        self.parent2 = parent2  # Person
+        self.children = list()  # List of Persons sorted by name
+
+    def has_parent(self, person):
+        return self.parent1 is person or self.parent2 is person
+
+    def shares_parent(self, unit):
+        return self.has_parent(unit.parent1) or self.has_parent(unit.parent2)
+
+    @staticmethod
+    def find_or_create(parent1, parent2):
+        """
+        Return the unit of the two parents, in either order, creating it and
+        indexing it under each parent by the other if they have had no children
+        together yet. A parent with many partners finds each unit at once.
+
+        :param parent1: Person
+        :param parent2: Person
+        :return: FamilyUnit
+        """
+        if parent1.units is not None:
+            unit = parent1.units.get(parent2)
+            if unit is not None:
+                return unit
+        unit = FamilyUnit(parent1, parent2)
+        if parent1.units is None:
+            parent1.units = {}
+        parent1.units[parent2] = unit
+        if parent2.units is None:
+            parent2.units = {}
+        parent2.units[parent1] = unit
+        return unit
+
+
 class Person:
+    __slots__ = ('name', 'spouses', 'parent1', 'parent2', 'unit', 'units')
+
+    # Ancestors never change once a person is created, so their sets can be
+    # shared by every query until a parent or name is rewritten.
+    ancestor_cache = AncestorCache(10000000)
+
     def __init__(self, name, parent1, parent2):
         """
         A constructor for the Person class. If the person has no parents,
@@ -15,17 +136,20 @@ class Person:
         :param parent1: Person
         :param parent2: Person
         """
-        self.name = name  # String
-        self.spouses = list()  # List of Strings
+        self.name = sys.intern(name)  # String
+        self.spouses = list()  # List of Persons sorted by name, one entry per marriage
         self.parent1 = parent1  # Person
         self.parent2 = parent2  # Person
-        self.children = list()  # List of Strings
+        self.units = None  # Dict of the other parent -> FamilyUnit, made at the first child
+        self.unit = None  # FamilyUnit this person is a child of
+        if parent1 is not None and parent2 is not None:
+            self.unit = FamilyUnit.find_or_create(parent1, parent2)
 
     def get_name(self):
         return self.name
 
     def get_spouses(self):
-        return self.spouses
+        return [spouse.name for spouse in self.spouses]
 
     def get_parent1(self):
         return self.parent1
@@ -33,64 +157,166 @@ class Person:
     def get_parent2(self):
         return self.parent2
 
+    @property
+    def children(self):
+        """
+        The children of every unit this person is a parent in, merged.
+
+        :return: A list of Persons sorted by name
+        """
+        if self.units is None:
+            return []
+        if len(self.units) == 1:
+            return next(iter(self.units.values())).children
+        return list(heapq.merge(*(unit.children for unit in self.units.values()), key=BY_NAME))
+
     def get_children(self):
-        return self.children
+        return [child.name for child in self.children]
 
     def set_name(self, name):
-        self.name = name
+        self.name = sys.intern(name)
+        Person.ancestor_cache.clear()
 
     def add_spouse(self, spouse):
-        self.spouses.append(spouse.get_name())
-        self.spouses.sort()
+        insort(self.spouses, spouse, key=BY_NAME)
+
+    def append_spouse(self, spouse):
+        """
+        Add a spouse without keeping the spouses sorted, for bulk loading.
+        Call sort_family once everyone has been added.
+        """
+        self.spouses.append(spouse)
 
     def set_parent1(self, parent):
         self.parent1 = parent
+        Person.ancestor_cache.clear()
 
     def set_parent2(self, parent):
         self.parent2 = parent
+        Person.ancestor_cache.clear()
 
     def add_child(self, child):
-        self.children.append(child.get_name())
-        self.children.sort()
+        """
+        Add a child to their unit, keeping it sorted. Both parents are told of
+        each child, so the second finds them there already.
+        """
+        children = child.unit.children
+        position = bisect_left(children, child.name, key=BY_NAME)
+        if position == len(children) or children[position] is not child:
+            children.insert(position, child)
 
-    def get_ancestors(self):
+    def append_child(self, child):
         """
-        Recurse through the parents of the person, and gather the list
-        of direct ancestors.
+        Add a child to their unit without keeping it sorted, for bulk loading.
+        Both parents are told of each child one after the other, so the second
+        finds them last in the unit already. Call sort_family once everyone has
+        been added.
+        """
+        children = child.unit.children
+        if not children or children[-1] is not child:
+            children.append(child)
 
-        :return: A list of strings of ancestors' names.
+    def sort_family(self):
+        for unit in (self.units or {}).values():
+            if unit.parent1 is self:
+                unit.children.sort(key=BY_NAME)
+        self.spouses.sort(key=BY_NAME)
+
+    def iter_ancestors(self, boundary=()):
         """
-        ancestors = list()
-        if self.parent1 is None or self.parent2 is None:
+        Walk up through the parents one generation at a time, without recursion,
+        and yield each direct ancestor once. Callers may stop as soon as they
+        have their answer. Ancestors named in the boundary are yielded but not
+        walked past.
+
+        :param boundary: A set of strings of names.
+        :return: A generator of Persons.
+        """
+        seen = set()
+        generation = [self]
+        while generation:
+            parents = list()
+            for person in generation:
+                if person.parent1 is None or person.parent2 is None:
+                    continue
+                for parent in (person.parent1, person.parent2):
+                    if parent.get_name() not in seen:
+                        seen.add(parent.get_name())
+                        if parent.get_name() not in boundary:
+                            parents.append(parent)
+                        yield parent
+            generation = parents
+
+    def get_ancestor_set(self):
+        """
+        Walk up through the parents without recursion, and gather the set of
+        direct ancestors. Ancestors whose own sets are cached are not walked
+        past. Results are memoized in the shared ancestor cache.
+
+        :return: A frozenset of strings of ancestors' names.
+        """
+        ancestors = Person.ancestor_cache.get(self)
+        if ancestors is not None:
             return ancestors
-        else:
-            ancestors.append(self.parent1.get_name())
-            ancestors.append(self.parent2.get_name())
-            for person in self.parent1.get_ancestors():
-                ancestors.append(person)
-            for person in self.parent2.get_ancestors():
-                ancestors.append(person)
-        ancestors.sort()
+        if self.parent1 is None or self.parent2 is None:
+            return frozenset()
+        ancestors = set()
+        frontier = [self]
+        while frontier:
+            person = frontier.pop()
+            if person.parent1 is None or person.parent2 is None:
+                continue
+            for parent in (person.parent1, person.parent2):
+                if parent.get_name() in ancestors:
+                    continue
+                ancestors.add(parent.get_name())
+                cached = Person.ancestor_cache.get(parent)
+                if cached is None:
+                    frontier.append(parent)
+                else:
+                    ancestors.update(cached)
+        ancestors = frozenset(ancestors)
+        Person.ancestor_cache.put(self, ancestors)
         return ancestors
 
+    def get_ancestors(self):
+        """
+        Gather the list of direct ancestors. Each ancestor is listed once,
+        even when they can be reached through both parents.
+
+        :return: A list of strings of ancestors' names.
+        """
+        return sorted(self.get_ancestor_set())
+
+    def get_full_siblings(self):
+        """
+        :return: A list of strings of the names of the other children of this person's parents.
+        """
+        if self.unit is None:
+            return list()
+        return [child.name for child in self.unit.children if child is not self]
+
+    def get_half_siblings(self):
+        """
+        Merge the already sorted children of every other unit of this person's parents.
+
+        :return: A list of strings of half-siblings' names.
+        """
+        if self.unit is None:
+            return list()
+        units = [unit for unit in self.parent1.units.values() if unit is not self.unit]
+        if self.parent2 is not self.parent1:
+            units.extend(unit for unit in self.parent2.units.values() if unit is not self.unit)
+        return [child.name for child in heapq.merge(*(unit.children for unit in units), key=BY_NAME)]
+
     def get_siblings(self):
         """
-        Gather the list of children for each parent, and add them to a list of
-        siblings for the current person. Removes the person themselves from the list.
+        Gather the full and half siblings of the person, from the family units
+        of their parents. Each list is already sorted, so they are merged.
 
         :return: A list of strings of siblings' names.
         """
-        siblings = list()
-        if self.parent1 is not None:
-            for child in self.parent1.get_children():
-                siblings.append(child)
-        if self.parent2 is not None:
-            for child in self.parent2.get_children():
-                if child not in siblings:
-                    siblings.append(child)
-        siblings.remove(self.name)
-        siblings.sort()
-        return siblings
+        return list(heapq.merge(self.get_full_siblings(), self.get_half_siblings()))
 
     def is_child(self, person2):
         """
@@ -106,12 +332,13 @@ class Person:
     def is_spouse(self, person2):
         """
         Check if this person is the spouse of the given person,
-        including ex-spouses
+        including ex-spouses. Spouses are kept sorted by name, so this is a binary search.
 
         :param person2: Person
         :return: Boolean
         """
-        return person2.get_name() in self.spouses
+        position = bisect_left(self.spouses, person2.get_name(), key=BY_NAME)
+        return position < len(self.spouses) and self.spouses[position].name == person2.get_name()
 
     def is_sibling(self, person2):
         """
@@ -121,29 +348,43 @@ class Person:
         :param person2: Person
         :return: Boolean
         """
-        if self.equals(person2):
-            return False
-        elif person2.get_parent1() is None or person2.get_parent2() is None:
-            return False
-        elif self.parent1 is not None \
-                and (self.parent1.equals(person2.get_parent1())
-                     or self.parent1.equals(person2.get_parent2())):
-            return True
-        elif self.parent2 is not None \
-                and (self.parent2.equals(person2.get_parent1())
-                     or self.parent2.equals(person2.get_parent2())):
-            return True
-        else:
+        if self is person2 or self.unit is None or person2.unit is None:
             return False
+        return self.unit.shares_parent(person2.unit)
+
+    def is_full_sibling(self, person2):
+        """
+        Check if this person and the given person are children of the same couple
+
+        :param person2: Person
+        :return: Boolean
+        """
+        return self is not person2 and self.unit is not None and self.unit is person2.unit
+
+    def is_half_sibling(self, person2):
+        """
+        Check if this person and the given person share exactly one parent
+
+        :param person2: Person
+        :return: Boolean
+        """
+        return self.is_sibling(person2) and self.unit is not person2.unit
 
     def is_ancestor(self, person2):
         """
-        Check if this person is the ancestor of the given person
+        Check if this person is the ancestor of the given person. If the given
+        person's ancestors are not cached, walk up from them and stop at the first match.
 
         :param person2: Person
         :return: Boolean
         """
-        return self.name in person2.get_ancestors()
+        ancestors = Person.ancestor_cache.get(person2)
+        if ancestors is not None:
+            return self.name in ancestors
+        for ancestor in person2.iter_ancestors():
+            if ancestor.equals(self):
+                return True
+        return False
 
     def is_cousin(self, person2):
         """
@@ -157,18 +398,22 @@ class Person:
             return False
         elif self.is_child(person2) or person2.is_child(self):
             return False
-        else:
-            ancestors1 = self.get_ancestors()
-            ancestors2 = person2.get_ancestors()
-
-            if person2.get_name() in ancestors1 or self.name in ancestors2:
+        ancestors1 = self.get_ancestor_set()
+        if person2.get_name() in ancestors1:
+            return False
+        ancestors2 = Person.ancestor_cache.get(person2)
+        if ancestors2 is not None:
+            return self.name not in ancestors2 and not ancestors1.isdisjoint(ancestors2)
+
+        # Walk up from person2, stopping as soon as this person turns up. A shared
+        # ancestor cannot lead back to this person, so the walk does not pass them.
+        shared = False
+        for ancestor in person2.iter_ancestors(ancestors1):
+            if ancestor.equals(self):
                 return False
-
-            for anc in ancestors1:
-                if anc in ancestors2:
-                    return True
-
-        return False
+            if ancestor.get_name() in ancestors1:
+                shared = True
+        return shared
 
     def is_unrelated(self, person2):
         """
@@ -0,0 +1,98 @@
+"""
+A cache of W and X query results for the main command loop
+"""
+
+
+from collections import OrderedDict
+
+
+# W lists that a birth changes for every child of both parents
+SIBLINGS = ('sibling', 'fullsibling', 'halfsibling')
+
+
+class QueryCache:
+    # W lists that can change whenever anyone joins the tree. They are tagged
+    # with the size of the tree and only reused while it stays the same.
+    SIZE_TAGGED = ('cousin', 'unrelated')
+
+    def __init__(self, tree, capacity):
+        """
+        Results are keyed on (relation, person) for W queries and on
+        (person, relation, person) for X queries, and evicted least recently used
+        first. Everything else is dropped precisely by the E events that change it:
+        a marriage changes the spouses of two people, and a birth changes the
+        children of two parents and the siblings, full and half, of their children.
+        Ancestors, and every X relation but spouse, never change once both people exist.
+
+        :param tree: FamilyTree or ColumnarFamilyTree
+        :param capacity: int, the number of results to keep
+        """
+        self.tree = tree
+        self.capacity = capacity
+        self.entries = OrderedDict()  # key -> (tree size or None, result)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result for the key, or compute and cache it.
+
+        :param key: tuple of strings
+        :param compute: function taking no arguments
+        :return: the result
+        """
+        entry = self.entries.get(key)
+        if entry is not None and (entry[0] is None or entry[0] == len(self.tree)):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        result = compute()
+        if isinstance(result, list):
+            result = tuple(result)
+        tag = len(self.tree) if len(key) == 2 and key[0] in QueryCache.SIZE_TAGGED else None
+        self.entries[key] = (tag, result)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return result
+
+    def drop(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def record_marriage(self, name1, name2):
+        """
+        Forget every result a marriage between the two people can change.
+
+        :param name1: String
+        :param name2: String
+        :return: None
+        """
+        self.drop(('spouse', name1))
+        self.drop(('spouse', name2))
+        self.drop((name1, 'spouse', name2))
+        self.drop((name2, 'spouse', name1))
+
+    def record_birth(self, parent1, parent2):
+        """
+        Forget every result a new child of the two parents can change. Call this
+        after the child has been added to both parents.
+
+        :param parent1: Person or ColumnarPerson
+        :param parent2: Person or ColumnarPerson
+        :return: None
+        """
+        for parent in (parent1, parent2):
+            self.drop(('child', parent.get_name()))
+            for child in parent.get_children():
+                for relation in SIBLINGS:
+                    self.drop((relation, child))
+
+    def get_stats(self):
+        """
+        :return: dict of counters
+        """
+        return {'entries': len(self.entries), 'hits': self.hits,
+                'misses': self.misses, 'invalidations': self.invalidations}
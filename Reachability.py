@@ -0,0 +1,247 @@
+"""
+A compressed reachability index for answering ancestor, cousin and unrelated
+checks without ancestor sets
+"""
+
+
+from array import array
+from operator import is_
+
+
+# Labels are tries over chain numbers, FANOUT slots to a node
+BITS = 4
+FANOUT = 1 << BITS
+MASK = FANOUT - 1
+
+# A trie leaf holds positions along FANOUT chains, -1 where there is none
+EMPTY_LEAF = (-1,) * FANOUT
+EMPTY_NODE = (None,) * FANOUT
+
+
+def merge_labels(label1, label2, level):
+    """
+    Merge two labels, keeping the furthest position along every chain. Subtrees
+    the labels share are kept as they are, and so is either label whenever
+    the other adds nothing to it.
+
+    :param label1: tuple trie, or None
+    :param label2: tuple trie, or None
+    :param level: int, the height of both tries
+    :return: tuple trie, or None
+    """
+    if label1 is label2 or label2 is None:
+        return label1
+    if label1 is None:
+        return label2
+    if level == 0:
+        merged = tuple(map(max, label1, label2))
+        if merged == label1:
+            return label1
+        if merged == label2:
+            return label2
+        return merged
+    merged = [merge_labels(node1, node2, level - 1) for node1, node2 in zip(label1, label2)]
+    if all(map(is_, merged, label1)):
+        return label1
+    if all(map(is_, merged, label2)):
+        return label2
+    return tuple(merged)
+
+
+def raise_position(label, chain, position, level):
+    """
+    :param label: tuple trie, or None
+    :param chain: int
+    :param position: int
+    :param level: int, the height of the trie
+    :return: tuple trie holding at least the position along the chain, copying
+             only the nodes on the way down to it
+    """
+    slot = (chain >> (BITS * level)) & MASK
+    if level == 0:
+        if label is None:
+            label = EMPTY_LEAF
+        if label[slot] >= position:
+            return label
+        return label[:slot] + (position,) + label[slot + 1:]
+    if label is None:
+        label = EMPTY_NODE
+    node = raise_position(label[slot], chain, position, level - 1)
+    if node is label[slot]:
+        return label
+    return label[:slot] + (node,) + label[slot + 1:]
+
+
+def find_position(label, chain, level):
+    """
+    :param label: tuple trie, or None
+    :param chain: int
+    :param level: int, the height of the trie
+    :return: int, the furthest position along the chain, or -1
+    """
+    if chain >> (BITS * (level + 1)):
+        return -1
+    while label is not None:
+        label = label[(chain >> (BITS * level)) & MASK]
+        if level == 0:
+            return label
+        level -= 1
+    return -1
+
+
+def labels_meet(label1, label2, level):
+    """
+    :param label1: tuple trie, or None
+    :param label2: tuple trie, or None
+    :param level: int, the height of both tries
+    :return: Boolean, True if some chain is in both labels
+    """
+    if label1 is None or label2 is None:
+        return False
+    if label1 is label2:
+        return True
+    if level == 0:
+        return max(map(min, label1, label2)) >= 0
+    return any(map(labels_meet, label1, label2, (level - 1,) * FANOUT))
+
+
+def lift(label, level, height):
+    """
+    :param label: tuple trie, or None
+    :param level: int, the height of the trie
+    :param height: int, at least level
+    :return: the same trie, as the first subtree of a trie of the given height
+    """
+    while label is not None and level < height:
+        label = (label,) + EMPTY_NODE[1:]
+        level += 1
+    return label
+
+
+class ReachabilityIndex:
+    # The relations that can be answered from the index alone
+    RELATIONS = ('ancestor', 'cousin', 'unrelated')
+
+    def __init__(self):
+        """
+        The tree is split into chains, each a line of people where every person is
+        a child of the one before. A person's label maps each chain holding one of
+        their ancestors to the furthest position of an ancestor along it, since
+        everyone before that position is an ancestor too.
+
+        No chain cover keeps those maps small, since everyone who marries into
+        the tree starts a chain of their own. So labels are persistent tries
+        keyed by chain number. A child's label is the merge of their parents'
+        labels and shares every subtree the merge leaves alone, so each new
+        person only costs the few trie nodes their parents changed. Tries grow a
+        level whenever the chains outgrow them, and older labels are lifted to
+        the new height when they are needed.
+
+        People are only ever added below their parents, so nothing already
+        labeled changes.
+        """
+        self.index = {}  # String -> int
+        self.chain = array('l')  # id -> chain
+        self.position = array('l')  # id -> position along the chain
+        self.labels = list()  # id -> tuple trie of chain -> furthest ancestor position
+        self.levels = array('b')  # id -> height of the label's trie
+        self.tails = array('l')  # chain -> id of the last person on it
+        self.level = 0  # height of the tries of new labels
+
+    def __len__(self):
+        return len(self.labels)
+
+    def get_label(self, person_id, height):
+        return lift(self.labels[person_id], self.levels[person_id], height)
+
+    def add(self, person):
+        """
+        Label a new person, whose parents must already be in the index.
+
+        :param person: Person
+        :return: None
+        """
+        person_id = len(self.labels)
+        if len(self.tails) >> (BITS * (self.level + 1)):
+            self.level += 1
+        level = self.level
+        parent1 = person.get_parent1()
+        parent2 = person.get_parent2()
+        label = None
+        chain = None
+        if parent1 is not None and parent2 is not None:
+            ids = (self.index[parent1.get_name()], self.index[parent2.get_name()])
+            label = merge_labels(self.get_label(ids[0], level), self.get_label(ids[1], level), level)
+            for parent_id in ids:
+                label = raise_position(label, self.chain[parent_id], self.position[parent_id], level)
+            for parent_id in ids:
+                if chain is None and self.tails[self.chain[parent_id]] == parent_id:
+                    chain = self.chain[parent_id]
+
+        if chain is None:
+            chain = len(self.tails)
+            self.tails.append(person_id)
+            self.position.append(0)
+        else:
+            self.tails[chain] = person_id
+            self.position.append(find_position(label, chain, level) + 1)
+        self.chain.append(chain)
+        self.labels.append(label)
+        self.levels.append(level)
+        self.index[person.get_name()] = person_id
+
+    def is_ancestor(self, name1, name2):
+        """
+        :param name1: String
+        :param name2: String
+        :return: Boolean, True if the first person is an ancestor of the second
+        """
+        id1 = self.index[name1]
+        id2 = self.index[name2]
+        return find_position(self.labels[id2], self.chain[id1], self.levels[id2]) >= self.position[id1]
+
+    def shares_ancestor(self, name1, name2):
+        """
+        Two people share an ancestor exactly when some chain holds ancestors of both,
+        since the first person on that chain is then an ancestor of both. Related
+        people's labels usually share whole subtrees, which are recognized
+        without looking inside them.
+
+        :param name1: String
+        :param name2: String
+        :return: Boolean
+        """
+        id1 = self.index[name1]
+        id2 = self.index[name2]
+        height = max(self.levels[id1], self.levels[id2])
+        return labels_meet(self.get_label(id1, height), self.get_label(id2, height), height)
+
+    def answer(self, name1, relation, name2):
+        """
+        Check whether the first person is the <relation> of the second person,
+        using the same definitions as Person.
+
+        :param name1: String
+        :param relation: String, one of RELATIONS
+        :param name2: String
+        :return: Boolean
+        """
+        if relation == 'ancestor':
+            return self.is_ancestor(name1, name2)
+        if name1 == name2:
+            return relation == 'unrelated'
+        lineal = self.is_ancestor(name1, name2) or self.is_ancestor(name2, name1)
+        shared = self.shares_ancestor(name1, name2)
+        if relation == 'cousin':
+            return not lineal and shared
+        return not lineal and not shared
+
+    def answer_batch(self, queries):
+        """
+        Answer a block of queries. The index is always up to date, so it can
+        stand in for an AncestorMatrix.
+
+        :param queries: list of (String, String, String) tuples of name, relation, name
+        :return: list of Booleans
+        """
+        return [self.answer(name1, relation, name2) for name1, relation, name2 in queries]
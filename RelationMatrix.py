@@ -0,0 +1,171 @@
+"""
+Export the relation between every pair of people in a family tree as a
+matrix file on disk, for analytics
+"""
+
+
+import mmap
+import multiprocessing
+from AncestorMatrix import AncestorMatrix
+
+
+# One byte per pair: the row person's relation to the column person
+RELATIONS = ('unrelated', 'self', 'ancestor', 'descendant', 'sibling', 'cousin')
+UNRELATED, SELF, ANCESTOR, DESCENDANT, SIBLING, COUSIN = range(len(RELATIONS))
+
+# Rows handed to a worker at a time
+CHUNK_ROWS = 256
+
+# Turns the characters of a binary string into bytes of 0 and 1
+SPREAD = bytes.maketrans(b'01', b'\x00\x01')
+
+# The bitsets of the tree being exported, as they were when the workers were
+# forked. Workers read them directly, so they are never pickled.
+shared_bitsets = None
+
+
+def npy_header(rows, columns):
+    """
+    Build a version 1.0 .npy header for a matrix of unsigned bytes, so the file
+    can be opened with numpy.load(path, mmap_mode='r') without copying it.
+
+    :param rows: int
+    :param columns: int
+    :return: bytes, padded to a multiple of 64
+    """
+    text = "{'descr': '|u1', 'fortran_order': False, 'shape': (%d, %d), }" % (rows, columns)
+    length = len(text) + 11  # magic, version and length fields, and the newline
+    text += ' ' * (-length % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + len(text).to_bytes(2, 'little') + text.encode('latin1')
+
+
+class RelationBitsets:
+    def __init__(self, tree):
+        """
+        Every person gets a bit, in the order they were added, and integer bitsets
+        of their ancestors, descendants and children. Ancestors are built parents
+        first and descendants children first, so each set is a union of sets
+        already built.
+
+        :param tree: FamilyTree or ColumnarFamilyTree
+        """
+        matrix = AncestorMatrix(tree)
+        self.size = len(matrix.rows)
+        self.ancestors = matrix.rows  # int -> int bitset
+        self.parents = list()  # int -> (int, int), or None
+        self.children = [0] * self.size  # int -> int bitset
+        for name in tree:
+            person = tree.get_person(name)
+            parent1 = person.get_parent1()
+            parent2 = person.get_parent2()
+            if parent1 is None or parent2 is None:
+                self.parents.append(None)
+            else:
+                self.parents.append((matrix.index[parent1.get_name()], matrix.index[parent2.get_name()]))
+            bit = 1 << len(self.parents) - 1
+            for parent in self.parents[-1] or ():
+                self.children[parent] |= bit
+        self.descendants = [0] * self.size  # int -> int bitset
+        for position in range(self.size - 1, -1, -1):
+            descendants = self.children[position]
+            remaining = self.children[position]
+            while remaining:
+                low = remaining & -remaining
+                descendants |= self.descendants[low.bit_length() - 1]
+                remaining ^= low
+            self.descendants[position] = descendants
+
+    def spread(self, bitset):
+        """
+        :param bitset: int
+        :return: int with byte k set to 1 wherever bit k of the bitset is set
+        """
+        if not bitset:
+            return 0
+        return int.from_bytes(format(bitset, '0%db' % self.size)[::-1].encode('ascii').translate(SPREAD), 'little')
+
+    def row(self, position):
+        """
+        Classify one person against everyone at once. Each relation is a bitset
+        over all columns, and they are combined into bytes with big-integer
+        arithmetic instead of a loop over columns.
+
+        :param position: int
+        :return: bytes, one relation code per column
+        """
+        me = 1 << position
+        ancestors = self.ancestors[position]
+        descendants = self.descendants[position]
+        # A parent can also be a sibling in a collapsed pedigree; the direct line wins
+        siblings = 0
+        if self.parents[position] is not None:
+            parent1, parent2 = self.parents[position]
+            siblings = (self.children[parent1] | self.children[parent2]) & ~(me | ancestors | descendants)
+
+        # Everyone sharing an ancestor with this person descends from one of their ancestors
+        shared = 0
+        remaining = ancestors
+        while remaining:
+            low = remaining & -remaining
+            shared |= self.descendants[low.bit_length() - 1]
+            remaining ^= low
+        cousins = shared & ~(ancestors | descendants | siblings | me)
+
+        codes = SELF * self.spread(me) + ANCESTOR * self.spread(descendants) \
+            + DESCENDANT * self.spread(ancestors) + SIBLING * self.spread(siblings) \
+            + COUSIN * self.spread(cousins)
+        return codes.to_bytes(self.size, 'little')
+
+
+def write_rows(path, offset, start, stop):
+    """
+    Worker task: compute rows start to stop and write them into the matrix file.
+
+    :param path: String
+    :param offset: int, the size of the file header
+    :param start: int
+    :param stop: int
+    :return: int, the number of rows written
+    """
+    size = shared_bitsets.size
+    with open(path, 'r+b') as matrix_file:
+        with mmap.mmap(matrix_file.fileno(), 0) as view:
+            for position in range(start, stop):
+                begin = offset + position * size
+                view[begin:begin + size] = shared_bitsets.row(position)
+    return stop - start
+
+
+def export_relation_matrix(tree, path, workers=1):
+    """
+    Write the relation of every person to every other as an N by N .npy matrix
+    of RELATIONS codes, with the names of its rows and columns, in tree order,
+    one per line in path + '.names'. The file is sized up front and filled
+    chunk by chunk through memory maps, so only the bitsets need fit in memory.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param path: String
+    :param workers: int, the number of processes to fill chunks in
+    :return: None
+    """
+    global shared_bitsets
+    shared_bitsets = RelationBitsets(tree)
+    size = shared_bitsets.size
+    header = npy_header(size, size)
+    with open(path, 'wb') as matrix_file:
+        matrix_file.write(header)
+        matrix_file.truncate(len(header) + size * size)
+    with open(path + '.names', 'w') as names:
+        for name in tree:
+            names.write(name + '\n')
+
+    tasks = [(path, len(header), start, min(start + CHUNK_ROWS, size)) for start in range(0, size, CHUNK_ROWS)]
+    try:
+        if workers > 1 and len(tasks) > 1:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                pool.starmap(write_rows, tasks)
+        else:
+            for task in tasks:
+                write_rows(*task)
+    finally:
+        shared_bitsets = None
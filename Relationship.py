@@ -0,0 +1,153 @@
+"""
+Naming how two people are related, from their nearest common ancestors
+"""
+
+
+ORDINALS = ('first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth', 'ninth', 'tenth')
+
+REMOVALS = ('once', 'twice', 'thrice')
+
+
+def get_parents(person):
+    """
+    :param person: Person or ColumnarPerson
+    :return: tuple of the person's parents, empty unless both are known
+    """
+    parent1 = person.get_parent1()
+    parent2 = person.get_parent2()
+    if parent1 is None or parent2 is None:
+        return ()
+    return parent1, parent2
+
+
+def find_common_ancestors(person1, person2, max_generations=None):
+    """
+    Search up from both people at once, one generation at a time, always growing
+    the side that has climbed fewer generations. The search stops as soon as no
+    unexplored common ancestor could be nearer than the nearest one found, so a
+    close relationship is found without walking either whole pedigree. Each
+    person counts as their own ancestor at generation 0, so a direct line is
+    found the same way.
+
+    :param person1: Person or ColumnarPerson
+    :param person2: Person or ColumnarPerson
+    :param max_generations: int, the most generations to climb on each side, or None
+    :return: (int, int, list of strings) the generations up from each person to the
+             nearest common ancestors and their names, or None if there are none
+    """
+    if person1.get_name() == person2.get_name():
+        return 0, 0, [person1.get_name()]
+    depths = ({person1.get_name(): 0}, {person2.get_name(): 0})
+    frontiers = ([person1], [person2])
+    climbed = [0, 0]
+    best = None  # (total, generations1, generations2)
+    meetings = list()
+
+    while frontiers[0] or frontiers[1]:
+        # An unexplored common ancestor is at least one generation above the side
+        # that has climbed less, so stop once that cannot beat what was found.
+        nearest = min(climbed[side] for side in (0, 1) if frontiers[side]) + 1
+        if best is not None and best[0] <= nearest:
+            break
+        side = 0 if not frontiers[1] or (frontiers[0] and climbed[0] <= climbed[1]) else 1
+        if max_generations is not None and climbed[side] >= max_generations:
+            frontiers[side].clear()
+            continue
+
+        climbed[side] += 1
+        mine, theirs = depths[side], depths[1 - side]
+        generation = list()
+        for person in frontiers[side]:
+            for parent in get_parents(person):
+                name = parent.get_name()
+                if name in mine:
+                    continue
+                mine[name] = climbed[side]
+                generation.append(parent)
+                if name in theirs:
+                    found = (climbed[side], theirs[name]) if side == 0 else (theirs[name], climbed[side])
+                    candidate = (found[0] + found[1],) + found
+                    if best is None or candidate < best:
+                        best = candidate
+                        meetings = [name]
+                    elif candidate == best:
+                        meetings.append(name)
+        frontiers[side][:] = generation
+
+    if best is None:
+        return None
+    return best[1], best[2], sorted(meetings)
+
+
+def greats(count, noun):
+    """
+    :param count: int
+    :param noun: String
+    :return: String, e.g. 'great-great-grandparent' for greats(2, 'grandparent'),
+             or '4x great-grandparent' past three greats
+    """
+    if count > 3:
+        return str(count) + 'x great-' + noun
+    return 'great-' * count + noun
+
+
+def ordinal(number):
+    return ORDINALS[number - 1] if number <= len(ORDINALS) else str(number) + 'th'
+
+
+def removal(number):
+    return REMOVALS[number - 1] if number <= len(REMOVALS) else str(number) + ' times'
+
+
+def describe(generations1, generations2, half):
+    """
+    Name the first person's relationship to the second from the number of
+    generations each is below their nearest common ancestors.
+
+    :param generations1: int
+    :param generations2: int
+    :param half: Boolean, True if they share only one of a couple
+    :return: String, e.g. 'second cousin once removed'
+    """
+    if generations1 == 0 and generations2 == 0:
+        return 'self'
+    elif generations1 == 0:
+        return 'parent' if generations2 == 1 else greats(generations2 - 2, 'grandparent')
+    elif generations2 == 0:
+        return 'child' if generations1 == 1 else greats(generations1 - 2, 'grandchild')
+
+    prefix = 'half-' if half else ''
+    if generations1 == 1 and generations2 == 1:
+        return prefix + 'sibling'
+    elif generations1 == 1:
+        return greats(generations2 - 2, prefix + 'aunt/uncle')
+    elif generations2 == 1:
+        return greats(generations1 - 2, prefix + 'niece/nephew')
+
+    degree = min(generations1, generations2) - 1
+    removed = abs(generations1 - generations2)
+    relation = ('half ' if half else '') + ordinal(degree) + ' cousin'
+    return relation if removed == 0 else relation + ' ' + removal(removed) + ' removed'
+
+
+def get_relationship(person1, person2, max_generations=None):
+    """
+    Name how the first person is related to the second. Relatives sharing a
+    single nearest common ancestor, rather than a couple, are half relatives.
+    People with no common ancestor are spouses or unrelated, and people with
+    none within a bounded search are not named at all.
+
+    :param person1: Person or ColumnarPerson
+    :param person2: Person or ColumnarPerson
+    :param max_generations: int, the most generations to search up from each, or None
+    :return: String
+    """
+    common = find_common_ancestors(person1, person2, max_generations)
+    if common is None:
+        if person1.is_spouse(person2):
+            return 'spouse'
+        if max_generations is not None:
+            return 'not related within %d generation%s' % (max_generations, '' if max_generations == 1 else 's')
+        return 'unrelated'
+    generations1, generations2, ancestors = common
+    return describe(generations1, generations2, len(ancestors) == 1)
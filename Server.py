@@ -0,0 +1,164 @@
+"""
+A long-running server that answers the E/W/X line protocol for many
+clients against one resident family tree
+"""
+
+
+import argparse
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from ColumnarTree import ColumnarFamilyTree
+from FamilyTree import FamilyTree
+from main import COMMANDS, add_event
+
+
+# W relations that scan large parts of the tree, and run off the event loop
+HEAVY = ('cousin', 'unrelated', 'descendant')
+
+# Commands that may walk whole pedigrees, and also run off the event loop
+HEAVY_COMMANDS = ('R', 'K', 'F')
+
+
+class ReadWriteLock:
+    def __init__(self):
+        """
+        Any number of queries may read the tree at once, but an E event waits
+        for them to finish and has the tree to itself. Waiting writers hold
+        back new readers, so a stream of queries cannot starve them.
+        """
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire_read(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writing and self.waiting_writers == 0)
+            self.readers += 1
+
+    async def release_read(self):
+        async with self.condition:
+            self.readers -= 1
+            self.condition.notify_all()
+
+    async def acquire_write(self):
+        async with self.condition:
+            self.waiting_writers += 1
+            await self.condition.wait_for(lambda: not self.writing and self.readers == 0)
+            self.waiting_writers -= 1
+            self.writing = True
+
+    async def release_write(self):
+        async with self.condition:
+            self.writing = False
+            self.condition.notify_all()
+
+
+class FamilyTreeServer:
+    def __init__(self, tree, heavy_workers=1):
+        """
+        :param tree: FamilyTree or ColumnarFamilyTree
+        :param heavy_workers: int, threads for the HEAVY W queries and HEAVY_COMMANDS
+        """
+        self.tree = tree
+        self.lock = ReadWriteLock()
+        self.executor = ThreadPoolExecutor(max_workers=heavy_workers)
+
+    async def run_query(self, query):
+        """
+        Answer one query line exactly as main() would.
+
+        :param query: String
+        :return: (String, Boolean) the output, and False if the connection should close
+        """
+        parts = query[:-1].split(' ')
+        out = io.StringIO()
+        command = COMMANDS.get(parts[0])
+        if command is None:
+            print('Please enter a valid query.', file=out)
+            return out.getvalue(), True
+
+        if command is add_event:
+            await self.lock.acquire_write()
+            try:
+                keep = command(self.tree, query, parts, out)
+            finally:
+                await self.lock.release_write()
+        else:
+            await self.lock.acquire_read()
+            try:
+                if parts[0] in HEAVY_COMMANDS or (parts[0] == 'W' and len(parts) >= 3 and parts[1] in HEAVY):
+                    keep = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, command, self.tree, query, parts, out)
+                else:
+                    keep = command(self.tree, query, parts, out)
+            finally:
+                await self.lock.release_read()
+        return out.getvalue(), keep
+
+    async def handle_client(self, reader, writer):
+        """
+        Answer one client's queries in order. Clients may send many lines without
+        waiting; responses come back in the order the lines were sent. A query
+        that would stop main() closes the connection instead.
+
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        :return: None
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                output, keep = await self.run_query(line.decode('utf-8'))
+                writer.write(output.encode('utf-8'))
+                await writer.drain()
+                if not keep:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """
+        Start listening on a TCP port, or on a Unix socket if a path is given.
+
+        :param host: String
+        :param port: int, 0 to pick a free port
+        :param path: String
+        :return: asyncio.Server
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path=path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+async def serve(tree, host, port, path):
+    server = FamilyTreeServer(tree)
+    listener = await server.start(host, port, path)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve family tree queries over TCP or a Unix socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--columnar', action='store_true',
+                        help='keep the tree in compact integer-ID columns instead of Person objects')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(ColumnarFamilyTree() if args.columnar else FamilyTree(),
+                          args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
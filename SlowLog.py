@@ -0,0 +1,77 @@
+"""
+A log of the commands in the main loop that take longer than a threshold,
+with optional profiles of them
+"""
+
+
+import cProfile
+import json
+import os
+import time
+from Stats import Stats
+
+
+class SlowQueryLog:
+    def __init__(self, threshold, log, profile_dir=None, profile_types=None):
+        """
+        Every command slower than the threshold is logged as one line of JSON with
+        its text, the size of the tree and the elapsed time. If a profile directory
+        is given, commands are run under cProfile and the profiles of slow ones are
+        written there, named by the start time and process ID of the run so that
+        earlier runs are never overwritten, and the directory is created if it
+        does not exist yet. Profiling can be limited to some
+        command types, such as 'W cousin', so the rest run at full speed.
+
+        :param threshold: float, in seconds
+        :param log: file to write log lines to
+        :param profile_dir: String, or None to never profile
+        :param profile_types: collection of strings from Stats.label, or None for all
+        """
+        self.threshold = threshold
+        self.log = log
+        self.profile_dir = profile_dir
+        self.profile_types = profile_types
+        self.slow = 0
+        self.run_id = '%s-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+        if profile_dir is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def should_profile(self, label):
+        return self.profile_dir is not None \
+            and (self.profile_types is None or label in self.profile_types)
+
+    def run(self, command, tree, query, parts, *args):
+        """
+        Run one command handler, logging it if it is slow.
+
+        :param command: a handler from main.COMMANDS
+        :param tree: FamilyTree or ColumnarFamilyTree
+        :param query: String
+        :param parts: list of strings
+        :return: whatever the handler returns
+        """
+        label = Stats.label(parts)
+        profiler = cProfile.Profile() if self.should_profile(label) else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return command(tree, query, parts, *args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self.record(query, label, len(tree), elapsed, profiler)
+
+    def record(self, query, label, tree_size, elapsed, profiler):
+        self.slow += 1
+        entry = {'query': query.rstrip('\n'), 'type': label, 'tree_size': tree_size,
+                 'elapsed_ms': elapsed * 1000}
+        if profiler is not None:
+            name = 'slow-%s-%d-%s.prof' % (self.run_id, self.slow, label.replace(' ', '_'))
+            path = os.path.join(self.profile_dir, name)
+            profiler.dump_stats(path)
+            entry['profile'] = path
+        self.log.write(json.dumps(entry, sort_keys=True) + '\n')
+        self.log.flush()
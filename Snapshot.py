@@ -0,0 +1,209 @@
+"""
+Save a family tree to a compact binary snapshot, and reopen it with
+memory mapping so queries can start before the whole file is read
+"""
+
+
+import mmap
+import struct
+from array import array
+from ColumnarTree import ColumnarFamilyTree, NO_ID
+
+
+MAGIC = b'FTSNAP01'
+
+# Magic, number of people, name bytes, child edges, spouse edges
+HEADER = struct.Struct('=8sqqqq')
+
+
+def padding(size):
+    """
+    :param size: int
+    :return: The number of bytes needed to align the size to 8 bytes.
+    """
+    return -size % 8
+
+
+def save_snapshot(tree, path):
+    """
+    Write the tree to a binary snapshot. Everything is stored as native-endian
+    8-byte columns, indexed by a dense ID given in the order people were added:
+
+        header
+        name offsets (people + 1), name bytes (UTF-8, padded)
+        IDs sorted by name, for binary search
+        parent1, parent2 (-1 for none)
+        child offsets (people + 1), child IDs sorted by name
+        spouse offsets (people + 1), spouse IDs sorted by name
+
+    :param tree: FamilyTree, ColumnarFamilyTree or SnapshotTree
+    :param path: String
+    :return: None
+    """
+    names = list(tree)
+    ids = {name: id for id, name in enumerate(names)}
+    name_offsets = array('q', [0])
+    encoded = list()
+    for name in names:
+        encoded.append(name.encode('utf-8'))
+        name_offsets.append(name_offsets[-1] + len(encoded[-1]))
+    order = array('q', sorted(range(len(names)), key=names.__getitem__))
+
+    parent1 = array('q')
+    parent2 = array('q')
+    child_offsets = array('q', [0])
+    child_ids = array('q')
+    spouse_offsets = array('q', [0])
+    spouse_ids = array('q')
+    for name in names:
+        person = tree.get_person(name)
+        for column, parent in ((parent1, person.get_parent1()), (parent2, person.get_parent2())):
+            column.append(NO_ID if parent is None else ids[parent.get_name()])
+        child_ids.extend(ids[child] for child in person.get_children())
+        child_offsets.append(len(child_ids))
+        spouse_ids.extend(ids[spouse] for spouse in person.get_spouses())
+        spouse_offsets.append(len(spouse_ids))
+
+    with open(path, 'wb') as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, len(names), name_offsets[-1], len(child_ids), len(spouse_ids)))
+        name_offsets.tofile(snapshot)
+        snapshot.write(b''.join(encoded))
+        snapshot.write(bytes(padding(name_offsets[-1])))
+        for column in (order, parent1, parent2, child_offsets, child_ids, spouse_offsets, spouse_ids):
+            column.tofile(snapshot)
+
+
+class NameTable:
+    def __init__(self, offsets, data, order):
+        """
+        The names of a snapshot, decoded from the mapped file only when asked for.
+
+        :param offsets: memoryview of ints
+        :param data: memoryview of bytes
+        :param order: memoryview of ints, IDs sorted by name
+        """
+        self.offsets = offsets
+        self.data = data
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, id):
+        return self.encoded(id).decode('utf-8')
+
+    def __iter__(self):
+        for id in range(len(self)):
+            yield self[id]
+
+    def encoded(self, id):
+        return bytes(self.data[self.offsets[id]:self.offsets[id + 1]])
+
+    def get(self, name):
+        """
+        Binary search the sorted IDs for the given name. UTF-8 bytes sort in the
+        same order as the strings they encode.
+
+        :param name: String
+        :return: int, or None if the name is not in the snapshot
+        """
+        target = name.encode('utf-8')
+        low = 0
+        high = len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.encoded(self.order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.order) and self.encoded(self.order[low]) == target:
+            return self.order[low]
+        return None
+
+
+class CsrAdjacency:
+    def __init__(self, offsets, targets):
+        """
+        A compressed sparse row edge list read from the mapped file.
+
+        :param offsets: memoryview of ints
+        :param targets: memoryview of ints
+        """
+        self.offsets = offsets
+        self.target = targets
+
+    def targets(self, source):
+        """
+        :param source: int
+        :return: list of ints, sorted by name
+        """
+        return self.target[self.offsets[source]:self.offsets[source + 1]].tolist()
+
+    def link(self, source, target):
+        raise TypeError('Snapshot trees are read-only')
+
+
+class SnapshotTree(ColumnarFamilyTree):
+    def __init__(self, path):
+        """
+        Memory-map a snapshot written by save_snapshot. Nothing but the header is
+        read up front; the operating system pages columns in as queries touch them.
+        The tree is read-only.
+
+        :param path: String
+        """
+        with open(path, 'rb') as snapshot:
+            self.map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, people, name_bytes, child_edges, spouse_edges = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(path + ' is not a family tree snapshot')
+
+        view = memoryview(self.map)
+        position = HEADER.size
+
+        def column(length):
+            nonlocal position
+            start = position
+            position += 8 * length
+            return view[start:position].cast('q')
+
+        name_offsets = column(people + 1)
+        name_data = view[position:position + name_bytes]
+        position += name_bytes + padding(name_bytes)
+        self.names = NameTable(name_offsets, name_data, column(people))
+        self.ids = self.names
+        self.parent1 = column(people)
+        self.parent2 = column(people)
+        child_offsets = column(people + 1)
+        self.children = CsrAdjacency(child_offsets, column(child_edges))
+        spouse_offsets = column(people + 1)
+        self.spouses = CsrAdjacency(spouse_offsets, column(spouse_edges))
+
+    def is_married(self, id1, id2):
+        return id2 in self.spouses.targets(id1)
+
+    def create_person(self, name, parent1, parent2):
+        raise TypeError('Snapshot trees are read-only')
+
+
+def load_snapshot(path, tree):
+    """
+    Copy a snapshot into an empty, mutable tree, so E events can be added to it.
+    People are created in ID order, which puts parents before their children.
+
+    :param path: String
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :return: None
+    """
+    snapshot = SnapshotTree(path)
+    people = list()
+    for id, name in enumerate(snapshot.names):
+        parent1 = snapshot.parent1[id]
+        parent2 = snapshot.parent2[id]
+        people.append(tree.create_person(name, None if parent1 == NO_ID else people[parent1],
+                                         None if parent2 == NO_ID else people[parent2]))
+    for id, person in enumerate(people):
+        for child in snapshot.children.targets(id):
+            person.add_child(people[child])
+        for spouse in snapshot.spouses.targets(id):
+            person.add_spouse(people[spouse])
@@ -0,0 +1,198 @@
+"""
+Per-command latency histograms and hot-path call counters for the main loop
+"""
+
+
+import functools
+import json
+import time
+from ColumnarTree import ColumnarFamilyTree
+from FamilyTree import FamilyTree
+from Person import Person
+
+
+# The functions that dominate query time, by the class that owns them
+HOT_PATHS = (
+    (Person, ('get_ancestor_set', 'get_ancestors', 'is_ancestor', 'is_cousin', 'is_unrelated', 'add_child')),
+    (FamilyTree, ('get_descendant_set', 'get_cousins', 'get_unrelated', 'is_unrelated')),
+    (ColumnarFamilyTree, ('get_ancestor_ids', 'get_descendant_ids', 'get_cousins', 'get_unrelated',
+                          'is_unrelated')),
+)
+
+# The relations a W or X query may name; anything else is labeled invalid
+W_RELATIONS = ('child', 'spouse', 'sibling', 'fullsibling', 'halfsibling', 'ancestor', 'descendant',
+               'cousin', 'unrelated')
+X_RELATIONS = ('child', 'spouse', 'sibling', 'fullsibling', 'halfsibling', 'ancestor', 'cousin', 'unrelated')
+
+
+class Histogram:
+    def __init__(self):
+        """
+        Latencies counted in power-of-two buckets of microseconds.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}  # int upper bound in microseconds -> int
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bound = 1 << int(seconds * 1000000).bit_length()
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+
+    def percentile(self, fraction):
+        """
+        :param fraction: float between 0 and 1
+        :return: float, the upper bound in seconds of the bucket holding that percentile
+        """
+        target = fraction * self.count
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= target:
+                return bound / 1000000
+        return 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'total_s': self.total, 'max_s': self.max,
+                'p50_s': self.percentile(0.50), 'p99_s': self.percentile(0.99),
+                'buckets_us': {str(bound): self.buckets[bound] for bound in sorted(self.buckets)}}
+
+
+class TimedOutput:
+    def __init__(self, out, stats):
+        """
+        A file wrapper that counts the time spent writing output.
+
+        :param out: file
+        :param stats: Stats
+        """
+        self.out = out
+        self.stats = stats
+
+    def write(self, text):
+        start = time.perf_counter()
+        written = self.out.write(text)
+        self.stats.record_call('output', time.perf_counter() - start)
+        return written
+
+    def flush(self):
+        self.out.flush()
+
+
+def timed_input(lines, stats):
+    """
+    Pass lines through, counting the time spent waiting for each one.
+
+    :param lines: iterator of strings
+    :param stats: Stats
+    :return: A generator of strings
+    """
+    while True:
+        start = time.perf_counter()
+        line = next(lines, '')
+        stats.record_call('input', time.perf_counter() - start)
+        if not line:
+            return
+        yield line
+
+
+class Stats:
+    def __init__(self):
+        """
+        Nothing is measured until a Stats object is handed to main(), and the hot
+        paths are only wrapped while enable_hot_paths is in effect, so a disabled
+        run pays nothing.
+        """
+        self.commands = {}  # String -> Histogram
+        self.calls = {}  # String -> [calls, seconds]
+        self.originals = list()  # (class, name, function)
+
+    def record_command(self, label, seconds):
+        if label not in self.commands:
+            self.commands[label] = Histogram()
+        self.commands[label].add(seconds)
+
+    def record_call(self, label, seconds):
+        if label not in self.calls:
+            self.calls[label] = [0, 0.0]
+        self.calls[label][0] += 1
+        self.calls[label][1] += seconds
+
+    def wrap(self, owner, name):
+        function = getattr(owner, name)
+        label = owner.__name__ + '.' + name
+        stats = self
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats.record_call(label, time.perf_counter() - start)
+
+        self.originals.append((owner, name, function))
+        setattr(owner, name, timed)
+
+    def enable_hot_paths(self):
+        """
+        Wrap every function in HOT_PATHS with a call and time counter.
+        Nested and recursive calls are each counted, with inclusive times.
+
+        :return: None
+        """
+        if not self.originals:
+            for owner, names in HOT_PATHS:
+                for name in names:
+                    self.wrap(owner, name)
+
+    def disable_hot_paths(self):
+        while self.originals:
+            owner, name, function = self.originals.pop()
+            setattr(owner, name, function)
+
+    @staticmethod
+    def label(parts):
+        """
+        :param parts: list of strings of one query
+        :return: String naming the kind of command, e.g. 'W cousin' or 'E child'.
+                 A W or X query naming no known relation is 'W invalid' or 'X invalid',
+                 so query text never becomes a label.
+        """
+        if parts[0] == 'E':
+            return 'E child' if len(parts) == 4 else 'E marriage'
+        if parts[0] == 'W':
+            return 'W ' + (parts[1] if len(parts) > 1 and parts[1] in W_RELATIONS else 'invalid')
+        if parts[0] == 'X':
+            return 'X ' + (parts[2] if len(parts) > 2 and parts[2] in X_RELATIONS else 'invalid')
+        return parts[0]
+
+    def to_dict(self, cache=None):
+        """
+        :param cache: QueryCache whose counters should be included, or None
+        :return: dict that can be written as JSON
+        """
+        report = {'commands': {label: self.commands[label].to_dict() for label in sorted(self.commands)},
+                  'calls': {label: {'calls': self.calls[label][0], 'total_s': self.calls[label][1]}
+                            for label in sorted(self.calls)}}
+        if cache is not None:
+            report['cache'] = cache.get_stats()
+        return report
+
+    def print_report(self, out, cache=None):
+        """
+        Print every counter as one line of JSON, followed by a blank line.
+
+        :param out: file
+        :param cache: QueryCache, or None
+        :return: None
+        """
+        print(json.dumps(self.to_dict(cache), sort_keys=True), file=out)
+        print(file=out)
+
+    def save(self, path, cache=None):
+        with open(path, 'w') as report:
+            json.dump(self.to_dict(cache), report, indent=2, sort_keys=True)
@@ -0,0 +1,76 @@
+"""
+A seeded generator of synthetic genealogies, written as E queries
+"""
+
+
+import argparse
+import random
+import sys
+
+
+# Preset family shapes. width is the most people kept per generation, children
+# is the range of children per couple, remarriage is the chance a parent also has
+# children with a second spouse (half-siblings), and collapse is the chance a
+# person marries within the tree instead of marrying in (pedigree collapse).
+SHAPES = {
+    'deep': {'width': 4, 'children': (1, 2), 'remarriage': 0.05, 'collapse': 0.0},
+    'wide': {'width': 1000000000, 'children': (0, 3), 'remarriage': 0.05, 'collapse': 0.0},
+    'mixed': {'width': 2000, 'children': (0, 5), 'remarriage': 0.1, 'collapse': 0.05},
+    'collapse': {'width': 300, 'children': (1, 4), 'remarriage': 0.1, 'collapse': 0.4},
+}
+
+
+def generate(people, shape='mixed', seed=0):
+    """
+    Generate E queries for a genealogy of about the given number of people.
+    Every generation marries, either someone from outside the tree or someone
+    else in the same generation, and has children who form the next generation.
+
+    :param people: int
+    :param shape: String, one of SHAPES
+    :param seed: int
+    :return: A generator of strings, one E query per line without newlines
+    """
+    settings = SHAPES[shape]
+    rng = random.Random(seed)
+    low, high = settings['children']
+    founders = max(2, min(settings['width'], people // 4))
+    count = 0
+
+    def new_name():
+        nonlocal count
+        count += 1
+        return 'P' + str(count)
+
+    generation = [new_name() for _ in range(founders)]
+    while count < people:
+        rng.shuffle(generation)
+        unmarried = list(generation)
+        children = list()
+        while unmarried and count < people:
+            person = unmarried.pop()
+            partners = 2 if rng.random() < settings['remarriage'] else 1
+            for _ in range(partners):
+                if unmarried and rng.random() < settings['collapse']:
+                    spouse = unmarried.pop()
+                else:
+                    spouse = new_name()
+                yield 'E ' + person + ' ' + spouse
+                for _ in range(rng.randint(low, high)):
+                    child = new_name()
+                    yield 'E ' + person + ' ' + spouse + ' ' + child
+                    children.append(child)
+        if not children:
+            children = [new_name() for _ in range(founders)]
+        generation = children[:settings['width']] if len(children) > settings['width'] \
+            else children
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic genealogy as E queries.')
+    parser.add_argument('people', type=int)
+    parser.add_argument('--shape', choices=sorted(SHAPES), default='mixed')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for line in generate(args.people, args.shape, args.seed):
+        sys.stdout.write(line + '\n')
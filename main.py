@@ -5,145 +5,520 @@ The main, runnable class for the Family Tree Project
 """
 
 
+import argparse
 import sys
+import time
+from itertools import islice
+from AncestorMatrix import AncestorMatrix
+from BulkIO import BUFFER_SIZE, read_chunks
+from ColumnarTree import ColumnarFamilyTree
 from FamilyTree import FamilyTree
-from Person import Person
-import Person
+from Journal import Journal
+from Kinship import get_kinship
+from ParallelTree import ParallelFamilyTree, usable_cpus
+from QueryCache import QueryCache
+from RelationMatrix import export_relation_matrix
+from Relationship import get_relationship
+from SlowLog import SlowQueryLog
+from Snapshot import SnapshotTree, save_snapshot
+from Stats import Stats, TimedOutput, timed_input
 
 
-def main():
-    tree = FamilyTree()
-    query = sys.stdin.readline()
+def add_event(tree, query, parts, out, cache=None):
+    """
+    Record one E query: a marriage of two people, or a child of two parents.
+    Anyone who does not exist yet is created. A read-only snapshot refuses events.
 
-    while query:
-        parts = query[:-1].split(' ')
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :param cache: QueryCache to keep up to date, or None
+    :return: False if processing should stop, otherwise True
+    """
+    if isinstance(tree, SnapshotTree):
+        print('The tree is a read-only snapshot! Event not recorded.', file=out)
+        return True
+
+    if len(parts) == 3:  # New Marriage
+        person1 = tree.get_person(parts[1])
+        person2 = tree.get_person(parts[2])
+
+        # Initialize person if they don't exist
+        if person1 is None:
+            person1 = tree.create_person(parts[1], None, None)
+        if person2 is None:
+            person2 = tree.create_person(parts[2], None, None)
+
+        # Set the proper spouse for the entries
+        person1.add_spouse(person2)
+        person2.add_spouse(person1)
+        if cache is not None:
+            cache.record_marriage(parts[1], parts[2])
+
+    elif len(parts) == 4:  # New Child
+        person1 = tree.get_person(parts[1])
+        person2 = tree.get_person(parts[2])
+
+        # Initialize the parents if they don't exist
+        if person1 is None:
+            person1 = tree.create_person(parts[1], None, None)
+        if person2 is None:
+            person2 = tree.create_person(parts[2], None, None)
+
+        # Create the child if they don't exist
+        if tree.get_person(parts[3]) is not None:
+            print(parts[3], ' already exists! Child not created.', file=out)
+        else:
+            person3 = tree.create_person(parts[3], person1, person2)
+            person1.add_child(person3)
+            person2.add_child(person3)
+            if cache is not None:
+                cache.record_birth(person1, person2)
+
+    else:
+        print('Please enter a valid query.', file=out)
+        return False
+    return True
+
+
+# W <relation> <person>: how to list each relation of a person
+LISTS = {
+    'child': lambda tree, person: person.get_children(),
+    'spouse': lambda tree, person: person.get_spouses(),
+    'sibling': lambda tree, person: person.get_siblings(),
+    'fullsibling': lambda tree, person: person.get_full_siblings(),
+    'halfsibling': lambda tree, person: person.get_half_siblings(),
+    'ancestor': lambda tree, person: person.get_ancestors(),
+    'cousin': lambda tree, person: tree.get_cousins(person),
+    'unrelated': lambda tree, person: tree.get_unrelated(person),
+}
+
+
+# W <relation> <person> [DEPTH d] [LIMIT n] [OFFSET m]: relations listed a generation at a time
+GENERATIONS = {
+    'descendant': lambda tree, person, depth: tree.iter_descendant_generations(person, depth),
+    'ancestor': lambda tree, person, depth: tree.iter_ancestor_generations(person, depth),
+}
+
+OPTIONS = ('DEPTH', 'LIMIT', 'OFFSET')
+
+
+def parse_options(words):
+    """
+    Read the keyword and number pairs that may follow a generational W query.
 
-        if parts[0] == 'E':
-            if len(parts) == 3:  # New Marriage
-                person1 = tree.get_person(parts[1])
-                person2 = tree.get_person(parts[2])
-
-                # Initialize person if they don't exist
-                if person1 is None:
-                    person1 = Person.Person(parts[1], None, None)
-                    tree.add_person(person1)
-                if person2 is None:
-                    person2 = Person.Person(parts[2], None, None)
-                    tree.add_person(person2)
-
-                # Set the proper spouse for the entries
-                person1.add_spouse(person2)
-                person2.add_spouse(person1)
-
-            elif len(parts) == 4:  # New Child
-                person1 = tree.get_person(parts[1])
-                person2 = tree.get_person(parts[2])
-
-                # Initialize the parents if they don't exist
-                if person1 is None:
-                    person1 = Person.Person(parts[1], None, None)
-                    tree.add_person(person1)
-                if person2 is None:
-                    person2 = Person.Person(parts[2], None, None)
-                    tree.add_person(person2)
-
-                # Create the child if they don't exist
-                if tree.get_person(parts[3]) is not None:
-                    print(parts[3], ' already exists! Child not created.')
-                else:
-                    person3 = Person.Person(parts[3], person1, person2)
-                    tree.add_person(person3)
-                    person1.add_child(person3)
-                    person2.add_child(person3)
+    :param words: list of strings
+    :return: dict of keyword -> int, or None if the words are not valid options
+    """
+    if len(words) % 2 != 0:
+        return None
+    options = dict()
+    for keyword, value in zip(words[::2], words[1::2]):
+        if keyword not in OPTIONS or keyword in options or not value.isdigit():
+            return None
+        options[keyword] = int(value)
+    return options
 
+
+def list_generations(tree, person, relation, options):
+    """
+    Stream a relation nearest generation first, each generation sorted, and skip
+    to the requested page. The walk stops as soon as the page is full, so
+    neither the whole relation nor its sorted list is ever built.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param person: Person or ColumnarPerson
+    :param relation: String, one of GENERATIONS
+    :param options: dict from parse_options
+    :return: iterator of strings
+    """
+    names = (name for generation in GENERATIONS[relation](tree, person, options.get('DEPTH'))
+             for name in generation)
+    offset = options.get('OFFSET', 0)
+    limit = options.get('LIMIT')
+    return islice(names, offset, None if limit is None else offset + limit)
+
+
+def list_relation(tree, query, parts, out, cache=None):
+    """
+    Answer one W query by listing every <relation> of <person>. Descendants,
+    and ancestors given any options, are listed a generation at a time.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :param cache: QueryCache to reuse results from, or None
+    :return: True, since a W query never stops processing
+    """
+    options = None
+    if len(parts) > 3 and parts[1] in GENERATIONS:
+        options = parse_options(parts[3:])
+    if len(parts) == 3 or options is not None:
+        print(query[:-1], file=out)
+        person = tree.get_person(parts[2])
+        if person is None:
+            print(parts[2], ' does not exist!', file=out)
+        elif options is not None or parts[1] == 'descendant':
+            for name in list_generations(tree, person, parts[1], options or {}):
+                print(name, file=out)
+        elif parts[1] in LISTS:
+            if cache is None:
+                names = LISTS[parts[1]](tree, person)
             else:
-                print('Please enter a valid query.')
-                break
+                names = cache.get_or_compute((parts[1], parts[2]), lambda: LISTS[parts[1]](tree, person))
+            for name in names:
+                print(name, file=out)
+        else:
+            print('Please enter a valid query.', file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
+
+
+# X <person> <relation> <person>: how to check each relation
+CHECKS = {
+    'child': lambda tree, person1, person2: person1.is_child(person2),
+    'spouse': lambda tree, person1, person2: person1.is_spouse(person2),
+    'sibling': lambda tree, person1, person2: person1.is_sibling(person2),
+    'fullsibling': lambda tree, person1, person2: person1.is_full_sibling(person2),
+    'halfsibling': lambda tree, person1, person2: person1.is_half_sibling(person2),
+    'ancestor': lambda tree, person1, person2: person1.is_ancestor(person2),
+    'cousin': lambda tree, person1, person2: person1.is_cousin(person2),
+    'unrelated': lambda tree, person1, person2: tree.is_unrelated(person1, person2),
+}
+
+
+def answer_relation(tree, query, parts, out, cache=None, answer=None):
+    """
+    Answer one X query. If the answer was already computed in a batch, it is
+    passed in and only the output is produced.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :param cache: QueryCache to reuse results from, or None
+    :param answer: Boolean or None
+    :return: False if processing should stop, otherwise True
+    """
+    if len(parts) == 4:
+        print(query[:-1], file=out)
+
+        person1 = tree.get_person(parts[1])
+        if person1 is None:
+            print(parts[1], 'does not exist!', file=out)
+            return False
+        person2 = tree.get_person(parts[3])
+        if person2 is None:
+            print(parts[3], ' does not exist!', file=out)
+            return False
+
+        if answer is None and parts[2] in CHECKS:
+            if cache is None:
+                answer = CHECKS[parts[2]](tree, person1, person2)
+            else:
+                answer = cache.get_or_compute(tuple(parts[1:]), lambda: CHECKS[parts[2]](tree, person1, person2))
+        if answer is None:
+            print('Please enter a valid query.', file=out)
+        else:
+            print('Yes' if answer else 'No', file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
 
-        elif parts[0] == 'W':  # List all <relation> of <person>
+
+def name_relationship(tree, query, parts, out, cache=None):
+    """
+    Answer one R query by naming how the first person is related to the second,
+    e.g. 'great-grandparent', 'half-sibling' or 'second cousin once removed'.
+    R <person> <person> DEPTH d only searches d generations up from each.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :param cache: unused, since relationships are found without walking whole pedigrees
+    :return: True, since an R query never stops processing
+    """
+    options = parse_options(parts[3:]) if len(parts) >= 3 else None
+    if options is not None and set(options) <= {'DEPTH'}:
+        print(query[:-1], file=out)
+        person1 = tree.get_person(parts[1])
+        person2 = tree.get_person(parts[2])
+        if person1 is None:
+            print(parts[1], ' does not exist!', file=out)
+        elif person2 is None:
+            print(parts[2], ' does not exist!', file=out)
+        else:
+            print(get_relationship(person1, person2, options.get('DEPTH')), file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
+
+
+def score_kinship(tree, query, parts, out, cache=None):
+    """
+    Answer one K query: K <proband> <person> [<person> ...] prints each person
+    with their kinship coefficient to the proband. A cohort of many people is
+    scored against the proband in a single pass.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :param cache: unused, since kinships are remembered by the tree's Kinship
+    :return: True, since a K query never stops processing
+    """
+    if len(parts) >= 3:
+        print(query[:-1], file=out)
+        missing = [name for name in parts[1:] if tree.get_person(name) is None]
+        if missing:
+            print(missing[0], ' does not exist!', file=out)
+        else:
+            kinship = get_kinship(tree)
             if len(parts) == 3:
-                print(query[:-1])
-                person = tree.get_person(parts[2])
-                if person is None:
-                    print(parts[2], ' does not exist!')
-                else:
-                    if parts[1] == 'child':
-                        for child in person.get_children():
-                            print(child)
-                    elif parts[1] == 'spouse':
-                        for spouse in person.get_spouses():
-                            print(spouse)
-                    elif parts[1] == 'sibling':
-                        for sibling in person.get_siblings():
-                            print(sibling)
-                    elif parts[1] == 'ancestor':
-                        for ancestor in person.get_ancestors():
-                            print(ancestor)
-                    elif parts[1] == 'cousin':
-                        for cousin in tree.get_cousins(person):
-                            print(cousin)
-                    elif parts[1] == 'unrelated':
-                        for unrelated in tree.get_unrelated(person):
-                            print(unrelated)
-                    else:
-                        print('Please enter a valid query.')
+                scores = [kinship.get_kinship(parts[1], parts[2])]
             else:
-                print('Please enter a valid query.')
-            print()
-
-        elif parts[0] == 'X':  # Is <person> the <relation> of <person>?
-            if len(parts) == 4:
-                print(query[:-1])
-
-                person1 = tree.get_person(parts[1])
-                if person1 is None:
-                    print(parts[1], 'does not exist!')
-                    break
-                person2 = tree.get_person(parts[3])
-                if person2 is None:
-                    print(parts[3], ' does not exist!')
-                    break
-
-                if parts[2] == 'child':
-                    if person1.is_child(person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'spouse':
-                    if person1.is_spouse(person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'sibling':
-                    if person1.is_sibling(person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'ancestor':
-                    if person1.is_ancestor(person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'cousin':
-                    if person1.is_cousin(person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                elif parts[2] == 'unrelated':
-                    if person1.is_unrelated(person2):
-                        print('Yes')
-                    else:
-                        print('No')
-                else:
-                    print('Please enter a valid query.')
+                scores = kinship.score_cohort(parts[1], parts[2:])
+            for name, score in zip(parts[2:], scores):
+                print(name, score, file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
+
+
+def score_inbreeding(tree, query, parts, out, cache=None):
+    """
+    Answer one F query: F <person> prints their inbreeding coefficient.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param query: String
+    :param parts: list of strings
+    :param out: file to print to
+    :param cache: unused
+    :return: True, since an F query never stops processing
+    """
+    if len(parts) == 2:
+        print(query[:-1], file=out)
+        if tree.get_person(parts[1]) is None:
+            print(parts[1], ' does not exist!', file=out)
+        else:
+            print(get_kinship(tree).get_inbreeding(parts[1]), file=out)
+    else:
+        print('Please enter a valid query.', file=out)
+    print(file=out)
+    return True
+
+
+def answer_block(tree, matrix, block, out, cache=None):
+    """
+    Answer a block of consecutive X queries together. The ancestor, cousin and
+    unrelated checks are looked up in the matrix in one batch, then every query
+    is printed in order exactly as answer_relation would.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param matrix: AncestorMatrix or ReachabilityIndex
+    :param block: list of Strings
+    :param out: file to print to
+    :param cache: QueryCache for the queries the matrix does not answer, or None
+    :return: False if processing should stop, otherwise True
+    """
+    split = [query[:-1].split(' ') for query in block]
+    batched = list()
+    for position, parts in enumerate(split):
+        if len(parts) == 4 and parts[2] in AncestorMatrix.RELATIONS \
+                and tree.get_person(parts[1]) is not None and tree.get_person(parts[3]) is not None:
+            batched.append((position, (parts[1], parts[2], parts[3])))
+    answers = dict(zip((position for position, _ in batched),
+                       matrix.answer_batch([triple for _, triple in batched])))
+    for position, query in enumerate(block):
+        if not answer_relation(tree, query, split[position], out, cache, answers.get(position)):
+            return False
+    return True
+
+
+COMMANDS = {
+    'E': add_event,
+    'W': list_relation,
+    'X': answer_relation,
+    'R': name_relationship,
+    'K': score_kinship,
+    'F': score_inbreeding,
+}
+
+
+def main(tree=None, matrix=None, lines=None, out=None, cache=None, stats=None, slow_log=None, journal=None):
+    """
+    Process queries until the input runs out or a query stops processing.
+    A STATS query prints the statistics gathered so far.
+
+    :param tree: FamilyTree or ColumnarFamilyTree
+    :param matrix: AncestorMatrix or ReachabilityIndex, to answer blocks of X queries together
+    :param lines: iterator of query strings, read from standard input by default
+    :param out: file to print to, standard output by default
+    :param cache: QueryCache, to reuse repeated W and X results
+    :param stats: Stats, to time every command, input and output
+    :param slow_log: SlowQueryLog, to log and profile slow commands
+    :param journal: Journal, to record every E event that is applied
+    :return: None
+    """
+    if tree is None:
+        tree = FamilyTree()
+    if lines is None:
+        lines = iter(sys.stdin.readline, '')
+    if out is None:
+        out = sys.stdout
+    if stats is not None:
+        lines = timed_input(lines, stats)
+        out = TimedOutput(out, stats)
+    query = next(lines, '')
+
+    while query:
+        parts = query[:-1].split(' ')
+
+        if parts[0] == 'STATS':
+            if stats is None:
+                print('Statistics are not enabled.', file=out)
+                print(file=out)
             else:
-                print('Please enter a valid query.')
-            print()
+                stats.print_report(out, cache)
+
+        elif matrix is not None and parts[0] == 'X':
+            start = time.perf_counter()
+            block = [query]
+            query = next(lines, '')
+            while query[:-1].split(' ')[0] == 'X':
+                block.append(query)
+                query = next(lines, '')
+            keep = answer_block(tree, matrix, block, out, cache)
+            if stats is not None:
+                stats.record_command('X block', time.perf_counter() - start)
+            if not keep:
+                break
+            continue
+
+        elif parts[0] not in COMMANDS:
+            print('Please enter a valid query.', file=out)
+
+        elif stats is None and slow_log is None:
+            if not COMMANDS[parts[0]](tree, query, parts, out, cache):
+                break
+            if journal is not None and parts[0] == 'E':
+                journal.append(query)
+
         else:
-            print('Please enter a valid query.')
+            start = time.perf_counter()
+            if slow_log is None:
+                keep = COMMANDS[parts[0]](tree, query, parts, out, cache)
+            else:
+                keep = slow_log.run(COMMANDS[parts[0]], tree, query, parts, out, cache)
+            if stats is not None:
+                stats.record_command(Stats.label(parts), time.perf_counter() - start)
+            if not keep:
+                break
+            if journal is not None and parts[0] == 'E':
+                journal.append(query)
 
-        query = sys.stdin.readline()
+        query = next(lines, '')
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Answer family tree queries read from standard input.')
+    parser.add_argument('--columnar', action='store_true',
+                        help='keep the tree in compact integer-ID columns instead of Person objects')
+    parser.add_argument('--batch', action='store_true',
+                        help='answer each block of consecutive X queries together from ancestor bitsets')
+    parser.add_argument('--reachability', action='store_true',
+                        help='answer X ancestor, cousin and unrelated from an incrementally kept reachability index')
+    parser.add_argument('--bulk', action='store_true',
+                        help='read and write in large blocks instead of a line at a time')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='answer queries from a read-only, memory-mapped snapshot')
+    parser.add_argument('--save-snapshot', metavar='PATH',
+                        help='write the tree to a binary snapshot once the input is processed')
+    parser.add_argument('--export-matrix', metavar='PATH',
+                        help='write every pairwise relation to an .npy matrix once the input is processed')
+    parser.add_argument('--export-workers', type=int, default=0, metavar='N',
+                        help='fill the exported matrix in N processes, one per usable CPU by default')
+    parser.add_argument('--journal', metavar='DIR',
+                        help='recover the tree from DIR, and journal every E event there')
+    parser.add_argument('--journal-sync', type=int, default=1000, metavar='N',
+                        help='write the journal to disk every N events')
+    parser.add_argument('--compact-every', type=int, default=100000, metavar='N',
+                        help='fold the journal into a base snapshot every N events')
+    parser.add_argument('--cache-size', type=int, default=0, metavar='N',
+                        help='remember up to N W and X results between the E events that change them')
+    parser.add_argument('--workers', type=int, default=0, metavar='N',
+                        help='spread W cousin and W unrelated over N worker processes, when more than one CPU is usable')
+    parser.add_argument('--parallel-threshold', type=int, default=100000, metavar='N',
+                        help='keep a W cousin or W unrelated walk serial until it has reached N people')
+    parser.add_argument('--stats', action='store_true',
+                        help='time every command and the hot query functions; STATS prints them')
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help='gather statistics as with --stats, and write them to PATH as JSON on exit')
+    parser.add_argument('--slow-ms', type=float, metavar='MS',
+                        help='log every command that takes longer than MS milliseconds')
+    parser.add_argument('--slow-log', metavar='PATH',
+                        help='append slow commands to PATH instead of standard error')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='run commands under cProfile and save the profiles of slow ones in DIR')
+    parser.add_argument('--profile-types', metavar='TYPES',
+                        help="only profile these comma-separated command types, e.g. 'W cousin,X unrelated'")
+    args = parser.parse_args()
+    if args.snapshot is not None:
+        tree = SnapshotTree(args.snapshot)
+    elif args.columnar:
+        tree = ColumnarFamilyTree()
+    elif args.workers > 0:
+        tree = ParallelFamilyTree(args.workers, args.parallel_threshold)
+    else:
+        tree = FamilyTree()
+    journal = None
+    if args.journal is not None:
+        if args.snapshot is not None:
+            parser.error('--journal needs a tree that E events can change')
+        journal = Journal(args.journal, args.journal_sync, args.compact_every)
+        journal.recover(tree, add_event)
+    if args.reachability and not isinstance(tree, FamilyTree):
+        parser.error('--reachability needs the Person-based tree')
+    if args.reachability:
+        matrix = tree.enable_reachability()
+    else:
+        matrix = AncestorMatrix(tree) if args.batch else None
+    cache = QueryCache(tree, args.cache_size) if args.cache_size > 0 else None
+    stats = None
+    if args.stats or args.stats_json is not None:
+        stats = Stats()
+        stats.enable_hot_paths()
+    slow_log = None
+    if args.slow_ms is not None:
+        slow_log = SlowQueryLog(args.slow_ms / 1000,
+                                sys.stderr if args.slow_log is None else open(args.slow_log, 'a', encoding='utf-8'),
+                                args.profile_dir,
+                                None if args.profile_types is None else set(args.profile_types.split(',')))
+    try:
+        if args.bulk:
+            with open(sys.stdout.fileno(), 'w', buffering=BUFFER_SIZE,
+                      encoding=sys.stdout.encoding, closefd=False) as out:
+                main(tree, matrix, read_chunks(sys.stdin), out, cache, stats, slow_log, journal)
+        else:
+            main(tree, matrix, cache=cache, stats=stats, slow_log=slow_log, journal=journal)
+    finally:
+        if journal is not None:
+            journal.close()
+        if slow_log is not None and args.slow_log is not None:
+            slow_log.log.close()
+        if isinstance(tree, ParallelFamilyTree):
+            tree.close()
+        if args.stats_json is not None:
+            stats.save(args.stats_json, cache)
+    if args.save_snapshot is not None:
+        save_snapshot(tree, args.save_snapshot)
+    if args.export_matrix is not None:
+        export_relation_matrix(tree, args.export_matrix, args.export_workers or usable_cpus())
@@ -0,0 +1,80 @@
+"""
+Every backend mode of main.py must print exactly what the plain Person-based
+tree prints for the same input
+"""
+
+
+import io
+import unittest
+from workload import make_workload
+
+import main
+from AncestorMatrix import AncestorMatrix
+from BulkIO import read_chunks
+from ColumnarTree import ColumnarFamilyTree
+from FamilyTree import FamilyTree
+from ParallelTree import ParallelFamilyTree
+from QueryCache import QueryCache
+
+
+def run(lines, tree, matrix=None, cache=None, bulk=False):
+    out = io.StringIO()
+    if bulk:
+        main.main(tree, matrix, read_chunks(io.StringIO(''.join(lines))), out, cache)
+    else:
+        main.main(tree, matrix, iter(lines), out, cache)
+    return out.getvalue()
+
+
+class BackendTest(unittest.TestCase):
+    SHAPES = (('mixed', 1500), ('collapse', 1000), ('deep', 800))
+
+    def check_mode(self, make_run):
+        for shape, people in self.SHAPES:
+            lines = make_workload(people, shape, seed=len(shape))
+            with self.subTest(shape=shape):
+                self.assertEqual(run(lines, FamilyTree()), make_run(lines))
+
+    def test_bulk(self):
+        self.check_mode(lambda lines: run(lines, FamilyTree(), bulk=True))
+
+    def test_columnar(self):
+        self.check_mode(lambda lines: run(lines, ColumnarFamilyTree()))
+
+    def test_batch(self):
+        def batch(lines):
+            tree = FamilyTree()
+            return run(lines, tree, AncestorMatrix(tree))
+        self.check_mode(batch)
+
+    def test_columnar_batch(self):
+        def batch(lines):
+            tree = ColumnarFamilyTree()
+            return run(lines, tree, AncestorMatrix(tree))
+        self.check_mode(batch)
+
+    def test_reachability(self):
+        def reachability(lines):
+            tree = FamilyTree()
+            return run(lines, tree, tree.enable_reachability())
+        self.check_mode(reachability)
+
+    def test_cache_size(self):
+        def cached(lines):
+            tree = FamilyTree()
+            return run(lines, tree, cache=QueryCache(tree, 50))
+        self.check_mode(cached)
+
+    def test_workers(self):
+        def parallel(lines):
+            tree = ParallelFamilyTree(2, 0)
+            tree.workers = 2  # use the pool even on a single CPU
+            try:
+                return run(lines, tree)
+            finally:
+                tree.close()
+        self.check_mode(parallel)
+
+
+if __name__ == '__main__':
+    unittest.main()
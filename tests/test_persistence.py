@@ -0,0 +1,113 @@
+"""
+The journal, snapshots and GEDCOM import must all give back the tree that
+was put in
+"""
+
+
+import io
+import os
+import random
+import tempfile
+import unittest
+from workload import make_workload
+
+import main
+from FamilyTree import FamilyTree
+from Gedcom import load_gedcom
+from Journal import Journal
+from Snapshot import SnapshotTree, load_snapshot, save_snapshot
+
+
+def answer(lines, tree):
+    out = io.StringIO()
+    main.main(tree, None, iter(lines), out, None)
+    return out.getvalue()
+
+
+class PersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        lines = make_workload(600, 'mixed', seed=11, checkpoints=1, count=4)
+        self.events = [line for line in lines if line.startswith('E ')]
+        self.queries = [line for line in lines if not line.startswith('E ')]
+        self.tree = FamilyTree()
+        answer(self.events, self.tree)
+        self.expected = answer(self.queries, self.tree)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_snapshot_round_trip(self):
+        path = os.path.join(self.directory.name, 'tree.snap')
+        save_snapshot(self.tree, path)
+        snapshot = SnapshotTree(path)
+        self.assertEqual(list(snapshot), list(self.tree))
+        self.assertEqual(answer(self.queries, snapshot), self.expected)
+        loaded = FamilyTree()
+        load_snapshot(path, loaded)
+        self.assertEqual(answer(self.queries, loaded), self.expected)
+
+    def test_snapshot_refuses_events(self):
+        path = os.path.join(self.directory.name, 'tree.snap')
+        save_snapshot(self.tree, path)
+        snapshot = SnapshotTree(path)
+        self.assertEqual(answer(['E new1 new2 new3\n'], snapshot),
+                         'The tree is a read-only snapshot! Event not recorded.\n')
+        self.assertIsNone(snapshot.get_person('new3'))
+
+    def test_journal_compaction_and_recovery(self):
+        directory = os.path.join(self.directory.name, 'journal')
+        journal = Journal(directory, sync_every=7, compact_every=100)
+        tree = FamilyTree()
+        self.assertEqual(journal.recover(tree, main.add_event), 0)
+        out = io.StringIO()
+        main.main(tree, None, iter(self.events), out, None, journal=journal)
+        journal.close()
+
+        # Only the newest base and the events since it are left
+        tail = len(self.events) % 100
+        self.assertEqual(sorted(os.listdir(directory)),
+                         ['base-%d.snap' % (len(self.events) // 100), 'journal-%d.log' % (len(self.events) // 100)])
+
+        # A line cut short by a crash is dropped
+        with open(os.path.join(directory, 'journal-%d.log' % (len(self.events) // 100)), 'a') as log:
+            log.write('E cut sho')
+        recovered = FamilyTree()
+        self.assertEqual(Journal(directory).recover(recovered, main.add_event), tail)
+        self.assertIsNone(recovered.get_person('sho'))
+        self.assertEqual(list(recovered), list(self.tree))
+        self.assertEqual(answer(self.queries, recovered), self.expected)
+
+    def test_gedcom_in_any_order(self):
+        # People keep their names as GEDCOM IDs. Only couples with children
+        # have family records, so queries about spouses are left out.
+        records = list()
+        families = {}
+        for name in self.tree:
+            person = self.tree.get_person(name)
+            if person.get_parent1() is None:
+                records.append('0 @%s@ INDI\n' % name)
+                continue
+            couple = (person.get_parent1().get_name(), person.get_parent2().get_name())
+            if couple not in families:
+                families[couple] = 'F%d' % len(families)
+                records.append('0 @%s@ FAM\n1 HUSB @%s@\n1 WIFE @%s@\n' % ((families[couple],) + couple))
+            records.append('0 @%s@ INDI\n1 NAME Someone /%s/\n1 FAMC @%s@\n' % (name, name, families[couple]))
+        queries = [query for query in self.queries if query[0] in 'WX' and 'spouse' not in query]
+        expected = answer(queries, self.tree)
+
+        rng = random.Random(5)
+        for shuffle in range(3):
+            with self.subTest(shuffle=shuffle):
+                path = os.path.join(self.directory.name, 'tree%d.ged' % shuffle)
+                with open(path, 'w') as gedcom:
+                    gedcom.write('0 HEAD\n' + ''.join(records) + '0 TRLR\n')
+                tree = FamilyTree()
+                load_gedcom(path, tree)
+                self.assertEqual(sorted(tree), sorted(self.tree))
+                self.assertEqual(answer(queries, tree), expected)
+                rng.shuffle(records)
+
+
+if __name__ == '__main__':
+    unittest.main()
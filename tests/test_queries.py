@@ -0,0 +1,108 @@
+"""
+Known answers for the R, K and F queries on small hand-built families
+"""
+
+
+import io
+import unittest
+from workload import make_workload
+
+import main
+from ColumnarTree import ColumnarFamilyTree
+from FamilyTree import FamilyTree
+from Kinship import get_kinship
+
+
+# G has a child with each of two partners, and each of those children has a
+# child of their own, so C1 and C2 are half first cousins. S1 and S2 are full
+# siblings, and I is the child of their marriage.
+FAMILY = '''E G A P1
+E G B P2
+E P1 X C1
+E P2 Y C2
+E M N S1
+E M N S2
+E S1 S2 I
+E G A
+'''
+
+
+def answer(text, tree=None):
+    out = io.StringIO()
+    main.main(FamilyTree() if tree is None else tree, None, iter(text.splitlines(keepends=True)), out, None)
+    return out.getvalue()
+
+
+class RelationshipTest(unittest.TestCase):
+    def check(self, query, expected):
+        for tree in (FamilyTree(), ColumnarFamilyTree()):
+            with self.subTest(query=query, tree=type(tree).__name__):
+                self.assertEqual(answer(FAMILY + query + '\n', tree).split('\n')[-3], expected)
+
+    def test_half_cousins(self):
+        self.check('R C1 C2', 'half first cousin')
+
+    def test_half_siblings(self):
+        self.check('R P1 P2', 'half-sibling')
+
+    def test_full_siblings(self):
+        self.check('R S1 S2', 'sibling')
+
+    def test_lineal(self):
+        self.check('R P1 C1', 'parent')
+        self.check('R G C2', 'grandparent')
+        self.check('R C2 G', 'grandchild')
+
+    def test_half_niece(self):
+        self.check('R C1 P2', 'half-niece/nephew')
+
+    def test_spouse_and_unrelated(self):
+        self.check('R G A', 'spouse')
+        self.check('R X Y', 'unrelated')
+
+    def test_depth(self):
+        self.check('R C1 C2 DEPTH 1', 'not related within 1 generation')
+        self.check('R C1 C2 DEPTH 2', 'half first cousin')
+
+    def test_invalid(self):
+        self.check('R C1 C2 LIMIT 2', 'Please enter a valid query.')
+
+
+class KinshipTest(unittest.TestCase):
+    def test_half_cousins(self):
+        self.assertEqual(answer(FAMILY + 'K C1 C2\n').split('\n')[-3], 'C2 0.03125')
+
+    def test_parent_and_child(self):
+        self.assertEqual(answer(FAMILY + 'K P1 C1\n').split('\n')[-3], 'C1 0.25')
+
+    def test_founder_with_self(self):
+        self.assertEqual(answer(FAMILY + 'K G G\n').split('\n')[-3], 'G 0.5')
+
+    def test_unrelated(self):
+        self.assertEqual(answer(FAMILY + 'K X Y\n').split('\n')[-3], 'Y 0.0')
+
+    def test_cohort(self):
+        lines = answer(FAMILY + 'K C1 C2 P1 G Y I\n').split('\n')
+        self.assertEqual(lines[-7:-2], ['C2 0.03125', 'P1 0.25', 'G 0.125', 'Y 0.0', 'I 0.0'])
+
+    def test_inbreeding(self):
+        self.assertEqual(answer(FAMILY + 'F I\nF C1\n').split('\n')[-7:-2],
+                         ['F I', '0.25', '', 'F C1', '0.0'])
+
+    def test_cohort_matches_pairs(self):
+        # A cohort larger than the proband's lineage is scored in one pass of
+        # columns, which must agree with scoring each pair on its own
+        tree = FamilyTree()
+        answer(''.join(line for line in make_workload(400, 'collapse', seed=3) if line.startswith('E ')), tree)
+        names = list(tree)
+        proband = names[-1]
+        cohort = names[::3]
+        kinship = get_kinship(tree)
+        kinship.refresh()
+        self.assertGreater(len(cohort), len(kinship.closure((kinship.index[proband],))))
+        self.assertEqual(kinship.score_cohort(proband, cohort),
+                         [kinship.get_kinship(proband, name) for name in cohort])
+
+
+if __name__ == '__main__':
+    unittest.main()
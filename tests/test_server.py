@@ -0,0 +1,73 @@
+"""
+The server must answer every client exactly as main.py answers the same
+lines, whether a client pipelines its whole input or many clients query at once
+"""
+
+
+import asyncio
+import io
+import unittest
+from workload import make_workload
+
+import main
+from FamilyTree import FamilyTree
+from Server import FamilyTreeServer
+
+
+def run_main(tree, lines):
+    out = io.StringIO()
+    main.main(tree, None, iter(lines), out, None)
+    return out.getvalue()
+
+
+async def send(port, lines):
+    """
+    Write every line without waiting for answers, then read until the server
+    closes the connection.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(''.join(lines).encode('utf-8'))
+    await writer.drain()
+    writer.write_eof()
+    output = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return output.decode('utf-8')
+
+
+class ServerTest(unittest.TestCase):
+    CLIENTS = 6
+
+    def test_clients(self):
+        lines = make_workload(1200, 'mixed', seed=7)
+        events = [line for line in lines if line.startswith('E ')]
+        queries = [line for line in lines if not line.startswith('E ')]
+        blocks = [queries[client::self.CLIENTS] for client in range(self.CLIENTS)]
+
+        expected = run_main(FamilyTree(), lines)
+        loaded = FamilyTree()
+        run_main(loaded, events)
+        expected_blocks = [run_main(loaded, block) for block in blocks]
+
+        async def exercise():
+            server = FamilyTreeServer(FamilyTree(), heavy_workers=2)
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                pipelined = await send(port, lines)
+                concurrent = await asyncio.gather(*(send(port, block) for block in blocks))
+            finally:
+                listener.close()
+                await listener.wait_closed()
+                server.close()
+            return pipelined, concurrent
+
+        pipelined, concurrent = asyncio.run(exercise())
+        self.assertEqual(expected, pipelined)
+        for client, output in enumerate(concurrent):
+            with self.subTest(client=client):
+                self.assertEqual(expected_blocks[client], output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+STATS output and the slow query log
+"""
+
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import main
+from FamilyTree import FamilyTree
+from SlowLog import SlowQueryLog
+from Stats import Stats
+
+
+QUERIES = 'E a b c\nE a b\nW child a\nW x/y c\nX c bad/relation a\nX c child a\n'
+
+
+def answer(text, **kwargs):
+    out = io.StringIO()
+    main.main(FamilyTree(), None, iter(text.splitlines(keepends=True)), out, None, **kwargs)
+    return out.getvalue()
+
+
+class StatsTest(unittest.TestCase):
+    def test_disabled(self):
+        self.assertEqual(answer('STATS\n'), 'Statistics are not enabled.\n\n')
+
+    def test_report(self):
+        stats = Stats()
+        report = answer(QUERIES + 'STATS\n', stats=stats).split('\n')
+        self.assertEqual(report[-1], '')
+        self.assertEqual(report[-2], '')
+        commands = json.loads(report[-3])['commands']
+        self.assertEqual({label: commands[label]['count'] for label in commands},
+                         {'E child': 1, 'E marriage': 1, 'W child': 1, 'W invalid': 1,
+                          'X invalid': 1, 'X child': 1})
+
+    def test_labels(self):
+        self.assertEqual(Stats.label(['W', 'cousin', 'a']), 'W cousin')
+        self.assertEqual(Stats.label(['W', 'descendant', 'a', 'DEPTH', '2']), 'W descendant')
+        self.assertEqual(Stats.label(['W', '../../etc', 'a']), 'W invalid')
+        self.assertEqual(Stats.label(['W']), 'W invalid')
+        self.assertEqual(Stats.label(['X', 'a', 'nephew', 'b']), 'X invalid')
+        self.assertEqual(Stats.label(['K', 'a', 'b']), 'K')
+
+
+class SlowLogTest(unittest.TestCase):
+    def test_every_command_is_logged_and_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiles = os.path.join(directory, 'not', 'made', 'yet')
+            log = io.StringIO()
+            slow_log = SlowQueryLog(0, log, profiles)
+            output = answer(QUERIES, slow_log=slow_log)
+            self.assertEqual(output, answer(QUERIES))
+
+            entries = [json.loads(line) for line in log.getvalue().splitlines()]
+            self.assertEqual([entry['type'] for entry in entries],
+                             ['E child', 'E marriage', 'W child', 'W invalid', 'X invalid', 'X child'])
+            self.assertEqual([entry['query'] for entry in entries], QUERIES.splitlines())
+            for entry in entries:
+                self.assertEqual(os.path.dirname(entry['profile']), profiles)
+                self.assertTrue(os.path.isfile(entry['profile']))
+
+    def test_profile_types(self):
+        log = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            answer(QUERIES, slow_log=SlowQueryLog(0, log, directory, {'W child'}))
+            entries = [json.loads(line) for line in log.getvalue().splitlines()]
+            self.assertEqual([entry['type'] for entry in entries if 'profile' in entry], ['W child'])
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_threshold(self):
+        log = io.StringIO()
+        answer(QUERIES, slow_log=SlowQueryLog(3600, log))
+        self.assertEqual(log.getvalue(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
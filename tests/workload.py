@@ -0,0 +1,60 @@
+"""
+A shared synthetic workload for the tests: E events with every kind of query
+interleaved, so each query sees a tree that is still growing
+"""
+
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmark import make_queries
+from Synthetic import generate
+
+
+def make_extra_queries(events, count, rng):
+    """
+    The queries Benchmark does not time: R, K and F, paged generational
+    listings, and full and half siblings. Everyone asked about exists.
+
+    :param events: list of E query strings
+    :param count: int, queries of each kind
+    :param rng: random.Random
+    :return: list of query strings
+    """
+    names = sorted({name for query in events for name in query.split()[1:]})
+    queries = list()
+    for _ in range(count):
+        queries.append('R %s %s\n' % (rng.choice(names), rng.choice(names)))
+        queries.append('R %s %s DEPTH 2\n' % (rng.choice(names), rng.choice(names)))
+        queries.append('K %s %s\n' % (rng.choice(names), ' '.join(rng.sample(names, 3))))
+        queries.append('F %s\n' % rng.choice(names))
+        queries.append('W descendant %s DEPTH 2 LIMIT 5\n' % rng.choice(names))
+        queries.append('W ancestor %s OFFSET 1 LIMIT 4\n' % rng.choice(names))
+        queries.append('W fullsibling %s\n' % rng.choice(names))
+        queries.append('W halfsibling %s\n' % rng.choice(names))
+        queries.append('X %s halfsibling %s\n' % (rng.choice(names), rng.choice(names)))
+    return queries
+
+
+def make_workload(people, shape, seed, checkpoints=4, count=5):
+    """
+    :param people: int
+    :param shape: String, one of Synthetic.SHAPES
+    :param seed: int
+    :param checkpoints: int, the number of times queries are asked as the tree grows
+    :param count: int, queries of each kind at each checkpoint
+    :return: list of query strings ending in newlines
+    """
+    rng = random.Random(seed)
+    events = [line + '\n' for line in generate(people, shape, seed)]
+    step = -(-len(events) // checkpoints)
+    lines = list()
+    for stop in range(step, len(events) + step, step):
+        lines.extend(events[stop - step:stop])
+        for block in make_queries(events[:stop], count, seed + stop).values():
+            lines.extend(block)
+        lines.extend(make_extra_queries(events[:stop], count, rng))
+    return lines